@@ -0,0 +1,82 @@
+# bench_dates.py
+"""
+Микробенчмарк разбора дат: python bench_dates.py [--number N]
+Сравнивает dates.parse_date с прежней парой parse_ru_day_month/parse_ddmm из bot.py
+на датах и на обычной болтовне (её fallback_date_parser видит чаще всего).
+"""
+import argparse
+import re
+import timeit
+from datetime import datetime
+
+import pytz
+
+from dates import parse_date
+
+DATES = ["4 ноября", "21.01", "21.01.2025", "завтра", "через 3 дня", "в пятницу", "1 май"]
+CHATTER = [
+    "привет, как дела?",
+    "скинь ссылку на вчерашнее видео пожалуйста",
+    "ок",
+    "Когда день программиста?",
+    "12345",
+    "🎉🎉🎉",
+]
+
+# --- прежняя реализация (для сравнения) ---
+_RU_MONTHS = {
+    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
+    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
+}
+_DATE_ONLY_RE = re.compile(r"^\s*(\d{1,2})\s+([А-Яа-яЁё]+)\s*$")
+_DDMM_RE = re.compile(r"^\s*(\d{1,2})[.\-/](\d{1,2})\s*$")
+
+
+def _legacy_ru_day_month(text):
+    m = _DATE_ONLY_RE.match(text or "")
+    if not m:
+        return None
+    mon = _RU_MONTHS.get(m.group(2).lower())
+    if not mon:
+        return None
+    tz = pytz.timezone("Europe/Moscow")
+    try:
+        return tz.localize(datetime(datetime.now(tz).year, mon, int(m.group(1))))
+    except ValueError:
+        return None
+
+
+def _legacy_ddmm(text):
+    m = _DDMM_RE.match(text or "")
+    if not m:
+        return None
+    tz = pytz.timezone("Europe/Moscow")
+    try:
+        return tz.localize(datetime(datetime.now(tz).year, int(m.group(2)), int(m.group(1))))
+    except ValueError:
+        return None
+
+
+def _legacy(text):
+    return _legacy_ru_day_month(text) or _legacy_ddmm(text)
+
+
+def _bench(fn, texts, number: int) -> float:
+    """Среднее время одного вызова, нс."""
+    total = timeit.timeit(lambda: [fn(t) for t in texts], number=number)
+    return total / (number * len(texts)) * 1e9
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--number", type=int, default=20000)
+    args = ap.parse_args()
+
+    for name, texts in (("даты", DATES), ("болтовня", CHATTER)):
+        new = _bench(parse_date, texts, args.number)
+        old = _bench(_legacy, texts, args.number)
+        print(f"{name:10s} parse_date: {new:8.0f} нс/вызов   прежний: {old:8.0f} нс/вызов   x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
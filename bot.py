@@ -1,40 +1,103 @@
 # bot.py
+import time
+_STARTED_AT = time.perf_counter()  # до остальных импортов: время старта включает и их
+
 import asyncio
+import io
 import pytz
 import re
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from aiogram.filters import CommandStart, Command
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import (
+    Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent, InlineQueryResultsButton,
+    InputFile,
+)
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from config import TOKEN
+from config import (
+    TOKEN, PROGRESSIVE_BUDGET, FSM_TTL, FSM_MAX_STATES,
+    LOOKUP_BURST, LOOKUP_REFILL, LOOKUP_DEDUPE,
+    HOLIDAYS_OFFLINE, HOLIDAYS_LOCAL_FILE, CALEND_TIMEOUT, ADMIN_IDS,
+    BROADCAST_RETRIES, BROADCAST_RETRY_DELAY,
+    CRAWL_DAYS, CRAWL_DELAY,
+)
 from holidays import (
     get_holidays_today,
     get_holidays_for_date,
-    get_holiday_details_grouped,   # <-- используем группировку
+    iter_ical,
+    get_day_items,
+    enrich_items,
+    partial_details,
+    group_rus_other,
 )
-from subscriptions import load_subs, add_sub, remove_sub
-from custom_holidays import get_for_date, add_custom
+from subscriptions import (
+    SubscriberStore, load_subs, add_sub, remove_sub,
+    load_prefs, set_pref, group_by_profile, DEFAULT_PROFILE, PROFILES,
+)
+from custom_holidays import (
+    add_custom, all_custom,
+    parse_document, import_rows, format_report, iter_export,
+)
+from dates import parse_date, parse_ical_range, today_msk, format_day, ICAL_YEARS_AROUND
+from classify import TAG_LABELS
+import holidays
+import custom_holidays
+import metrics
+import providers
+import snapshot
+from fsm_storage import TTLMemoryStorage
+from throttling import LookupThrottle
+from search_index import INDEX as HOLIDAY_INDEX
+
+metrics.mark_started(_STARTED_AT)
 
-dp = Dispatcher()
+FSM_STORAGE = TTLMemoryStorage(ttl=FSM_TTL, max_size=FSM_MAX_STATES)
+metrics.gauge("fsm_live_states", FSM_STORAGE.live_count)
+
+# Источники праздников по убыванию приоритета; опрашиваются параллельно
+PROVIDERS = providers.build_providers(HOLIDAYS_OFFLINE, HOLIDAYS_LOCAL_FILE, CALEND_TIMEOUT)
+CALEND = next((p for p in PROVIDERS if isinstance(p, providers.CalendRuProvider)), None)
+LOCAL_PROVIDERS = [p for p in PROVIDERS if not p.online]
+CUSTOM_PROVIDERS = [p for p in PROVIDERS if isinstance(p, providers.CustomProvider)]
+
+dp = Dispatcher(storage=FSM_STORAGE)
+LOOKUP_THROTTLE = LookupThrottle(burst=LOOKUP_BURST, refill=LOOKUP_REFILL, dedupe_window=LOOKUP_DEDUPE)
+dp.message.middleware(LOOKUP_THROTTLE)  # inline-режим берёт из тех же бакетов: LOOKUP_THROTTLE.allow
 
 # --- Клавиатура ---
 MAIN_KB = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="📆 Сегодня"), KeyboardButton(text="🔎 Поиск по дате")],
         [KeyboardButton(text="🔔 Подписаться"), KeyboardButton(text="🔕 Отписаться")],
-        [KeyboardButton(text="➕ Добавить праздник")],
+        [KeyboardButton(text="➕ Добавить праздник"), KeyboardButton(text="⚙️ Что присылать")],
     ],
     resize_keyboard=True,
 )
 
+# --- Что присылать ---
+PROFILE_BUTTONS = {
+    "🌍 все страны": "all",
+    "🇷🇺 только россия": "russia",
+    "🎈 только свои": "custom",
+}
+PROFILE_ARGS = {"all": "all", "все": "all", "russia": "russia", "россия": "russia", "custom": "custom", "свои": "custom"}
+PROFILE_NAMES = {"all": "все страны", "russia": "только Россия", "custom": "только свои праздники"}
+PROFILE_KB = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="🌍 Все страны")], [KeyboardButton(text="🇷🇺 Только Россия")],
+              [KeyboardButton(text="🎈 Только свои")]],
+    resize_keyboard=True,
+)
+
 # --- Подписки ---
-CHAT_IDS: set[int] = load_subs()
+CHAT_IDS: SubscriberStore = load_subs()
+PREFS: dict[int, str] = load_prefs()
 
 # --- FSM ---
 class AddHoliday(StatesGroup):
@@ -45,113 +108,309 @@ class AddHoliday(StatesGroup):
 class SearchByDate(StatesGroup):
     waiting_date = State()
 
-# --- Парсеры дат ---
-RU_MONTHS = {
-    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
-    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
-}
-DATE_ONLY_RE = re.compile(r"^\s*(\d{1,2})\s+([А-Яа-яЁё]+)\s*$")
-DDMM_RE = re.compile(r"^\s*(\d{1,2})[.\-/](\d{1,2})\s*$")
-
-def parse_ru_day_month(text: str) -> datetime | None:
-    m = DATE_ONLY_RE.match(text or "")
-    if not m:
-        return None
-    day = int(m.group(1))
-    mon_name = m.group(2).lower()
-    mon = RU_MONTHS.get(mon_name)
-    if not mon:
-        return None
-    tz = pytz.timezone("Europe/Moscow")
-    try:
-        return tz.localize(datetime(datetime.now(tz).year, mon, day))
-    except ValueError:
-        return None
-
-def parse_ddmm(text: str) -> datetime | None:
-    m = DDMM_RE.match(text or "")
-    if not m:
-        return None
-    day = int(m.group(1))
-    mon = int(m.group(2))
-    tz = pytz.timezone("Europe/Moscow")
-    try:
-        return tz.localize(datetime(datetime.now(tz).year, mon, day))
-    except ValueError:
-        return None
-
 # --- Форматирование ---
+def html_title(d: dict) -> str:
+    """Название ссылкой; у локальных источников ссылки может не быть."""
+    if d.get("url"):
+        return f'<a href="{d["url"]}"><b>{d["title"]}</b></a>'
+    return f"<b>{d['title']}</b>"
+
 def html_list_rus(details: list[dict]) -> str:
     """Ссылки + описание (для России)."""
     if not details:
         return "• Ничего не найдено"
     lines = []
     for d in details:
-        lines.append(f'• <a href="{d["url"]}"><b>{d["title"]}</b></a>\n  <i>{d.get("desc","")}</i>')
+        lines.append(f'• {html_title(d)}\n  <i>{d.get("desc","")}</i>')
     return "\n".join(lines)
 
 def html_list_links_only(details: list[dict]) -> str:
-    """Только ссылки (для других стран)."""
+    """Только ссылки (для других стран), с меткой страны/категории по сохранённым тегам."""
     if not details:
         return "• —"
-    return "\n".join(f'• <a href="{d["url"]}"><b>{d["title"]}</b></a>' for d in details)
+    lines = []
+    for d in details:
+        label = next((TAG_LABELS[t] + " " for t in d.get("tags", ()) if t in TAG_LABELS), "")
+        lines.append(f"• {label}{html_title(d)}")
+    return "\n".join(lines)
 
-# --- Отправка двух сообщений (Россия / Остальные) ---
-async def send_grouped(bot: Bot, chat_id: int, target: date):
-    rus, other = get_holiday_details_grouped(target)
+# --- Готовые тексты (кэш по дате и профилю) ---
+# (дата, профиль) -> (версия локальных источников, тексты): новая версия вытесняет старую,
+# прошедшие даты снимает precompute_inline
+_RENDERED: dict[tuple[date, str], tuple[int, list[str]]] = {}
+
+
+def _rendered(target: date, profile: str, version: int) -> list[str] | None:
+    hit = _RENDERED.get((target, profile))
+    return hit[1] if hit and hit[0] == version else None
+
+
+def prune_rendered(today: date) -> None:
+    for key in [k for k in _RENDERED if k[0] < today]:
+        del _RENDERED[key]
+
+
+def providers_for(profile: str) -> list[providers.HolidayProvider]:
+    return CUSTOM_PROVIDERS if profile == "custom" else PROVIDERS
 
-    # «свои»
-    custom_list = get_for_date(target)
+
+def _split_items(items: list[dict]) -> tuple[list[dict], list[dict], list[str]]:
+    """Слитый список источников -> (Россия, остальные, названия своих)."""
+    custom_list = [it["title"] for it in items if it["source"] == "custom"]
+    rus, other = group_rus_other([it for it in items if it["source"] != "custom"])
+    return rus, other, custom_list
+
+
+def _render_texts(items: list[dict], profile: str = DEFAULT_PROFILE) -> list[str]:
+    rus, other, custom_list = _split_items(items)
     custom_block = "\n".join(f"• (своё) <b>{t}</b>" for t in custom_list)
 
+    if profile == "custom":
+        return ["<b>🎈 Свои праздники:</b>\n" + (custom_block or "• —")]
+
     # Сообщение 1 — Россия
     head_rus = "<b>🇷🇺 Праздники России:</b>\n"
     body_rus = html_list_rus(rus)
-    if custom_block:
+    if custom_block:  # свои — в каждом профиле
         body_rus += "\n" + custom_block
-    await bot.send_message(
-        chat_id,
-        head_rus + body_rus,
-        parse_mode="HTML",
-        disable_web_page_preview=True,
-    )
+    texts = [head_rus + body_rus]
+    if profile == "russia":
+        return texts
 
     # Сообщение 2 — Остальные (только если есть)
     if other:
         head_other = "\n\n<b>🌍 Другие праздники:</b>\n"
-        body_other = html_list_links_only(other)
+        texts.append(head_other + html_list_links_only(other))
+    return texts
+
+
+async def render_grouped(target: date, profile: str = DEFAULT_PROFILE) -> tuple[list[str], bool]:
+    """
+    Тексты сообщений для даты и профиля подписчика: для "all" — [Россия] или [Россия, Остальные].
+    Второе значение — полный ли ответ: False, если источник не успел или сайт ничего не дал.
+    """
+    sources = providers_for(profile)  # для "custom" сайт не нужен
+    version = providers.data_version(sources)
+    texts = _rendered(target, profile, version)
+    if texts is not None:
+        return texts, True
+
+    items, complete = await providers.query(target, sources)
+    texts = _render_texts(items, profile)
+    # неполное не кэшируем — дата может появиться позже
+    online = {p.name for p in sources if p.online}
+    complete = complete and (not online or any(it["source"] in online for it in items))
+    if complete:
+        _RENDERED[(target, profile)] = (version, texts)
+    return texts, complete
+
+
+def render_cached(target: date) -> tuple[list[str], list[dict]] | None:
+    """Тексты (профиль "all") и список праздников только из кэшей; None, если дату ещё не скачивали."""
+    items = providers.peek(target, PROVIDERS)
+    if items is None:
+        return None
+    version = providers.data_version(PROVIDERS)
+    texts = _rendered(target, DEFAULT_PROFILE, version)
+    if texts is None:
+        texts = _render_texts(items)
+        _RENDERED[(target, DEFAULT_PROFILE)] = (version, texts)
+    rus, other, _ = _split_items(items)
+    return texts, rus + other
+
+
+def _export_rendered() -> dict:
+    # только будущие даты и тексты текущей версии — устаревшие после рестарта не нужны
+    today = today_msk()
+    current = {p: providers.data_version(providers_for(p)) for p in PROFILES}
+    return {
+        f"{d.isoformat()}|{v}|{p}": texts
+        for (d, p), (v, texts) in list(_RENDERED.items())
+        if d >= today and v == current.get(p)
+    }
+
+
+def _import_rendered(data: dict) -> None:
+    for key, texts in data.items():
+        d, v, p = (key.split("|") + [DEFAULT_PROFILE])[:3]
+        _RENDERED[(date.fromisoformat(d), p)] = (int(v), texts)
+
+
+snapshot.register("rendered", _export_rendered, _import_rendered)
+
+
+# --- Отправка двух сообщений (Россия / Остальные) ---
+async def _send_texts(bot: Bot, chat_id: int, texts: list[str]):
+    for text in texts:
         await bot.send_message(
             chat_id,
-            head_other + body_other,
+            text,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        )
+
+async def send_grouped(bot: Bot, chat_id: int, target: date):
+    profile = PREFS.get(chat_id, DEFAULT_PROFILE)
+    if CALEND is not None and profile != "custom" and CALEND.peek(target) is None:
+        await send_progressive(bot, chat_id, target, profile)
+        return
+    with metrics.timed("send_grouped"):
+        texts, _ = await render_grouped(target, profile)
+        await _send_texts(bot, chat_id, texts)
+
+# --- Прогрессивный ответ: сначала названия, описания — правкой сообщения ---
+# дата -> загрузка страницы дня / обогащение; по одной на дату, сколько бы чатов их ни ждали.
+# Обе идут в пуле calend.ru — тот же предел одновременных загрузок, что и у провайдера.
+_FETCHING: dict[date, asyncio.Future] = {}
+_ENRICHING: dict[date, asyncio.Future] = {}
+
+def _once(running: dict[date, asyncio.Future], target: date, fn, *args) -> asyncio.Future:
+    fut = running.get(target)
+    if fut is None:
+        fut = asyncio.get_running_loop().run_in_executor(providers.CALEND_POOL, fn, target, *args)
+        running[target] = fut
+        fut.add_done_callback(lambda _: running.pop(target, None))
+    return fut
+
+def _enrich_task(target: date, base: list[dict]) -> asyncio.Future:
+    return _once(_ENRICHING, target, enrich_items, base)
+
+def _draft_text(target: date, base: list[dict], profile: str) -> str:
+    """Черновик по названиям: для "russia" — только то, что уже видно как российское."""
+    items = partial_details(base)
+    if profile == "russia":
+        head, items = f"<b>🇷🇺 Праздники России {format_day(target)}:</b>\n", group_rus_other(items)[0]
+    else:
+        head = f"<b>🎉 Праздники {format_day(target)}:</b>\n"
+    body = html_list_links_only(items) + "\n\n" if items else ""
+    return head + body + "<i>⏳ Подгружаю описания…</i>"
+
+async def send_progressive(bot: Bot, chat_id: int, target: date, profile: str):
+    """
+    Дата не в кэше: сразу отправляем названия со страницы дня, потом правим сообщение
+    на полный ответ — когда подтянутся описания или выйдет PROGRESSIVE_BUDGET.
+    Локальные источники быстрые — их ответ просто вливается в итог.
+    """
+    t0 = time.perf_counter()
+    # shield: ушедший чат не должен отменить загрузку, которую ждут другие
+    base, (local, _) = await asyncio.gather(
+        asyncio.shield(_once(_FETCHING, target, get_day_items)),
+        providers.query(target, LOCAL_PROVIDERS),
+    )
+    if not base:  # сайт дня не знает — отвечаем тем, что есть локально
+        await _send_texts(bot, chat_id, _render_texts(local, profile))
+        metrics.observe("first_answer", time.perf_counter() - t0)
+        return
+
+    draft = await bot.send_message(
+        chat_id,
+        _draft_text(target, base, profile),
+        parse_mode="HTML",
+        disable_web_page_preview=True,
+    )
+    metrics.observe("first_answer", time.perf_counter() - t0)
+
+    budget = max(0.0, PROGRESSIVE_BUDGET - (time.perf_counter() - t0))
+    try:
+        # shield: по таймауту задача не отменяется и допишет кэш в фоне
+        items = await asyncio.wait_for(asyncio.shield(_enrich_task(target, base)), budget)
+    except Exception as e:
+        if not isinstance(e, asyncio.TimeoutError):
+            print(f"[progressive] {target} enrich error: {e}")
+        metrics.incr("progressive_timeouts")
+        items = partial_details(base)
+
+    texts = _render_texts(providers.merge([(CALEND.name, items), ("local", local)]), profile)
+    try:
+        await bot.edit_message_text(
+            texts[0],
+            chat_id=chat_id,
+            message_id=draft.message_id,
             parse_mode="HTML",
             disable_web_page_preview=True,
         )
+    except TelegramBadRequest as e:  # например, «message is not modified»
+        print(f"[progressive] edit error: {e}")
+    await _send_texts(bot, chat_id, texts[1:])
+    metrics.observe("full_answer", time.perf_counter() - t0)
 
 # --- Рассылка «сегодня» ---
 async def send_today(bot: Bot, chat_id: int):
-    tz = pytz.timezone("Europe/Moscow")
-    today_msk: date = datetime.now(tz).date()
-    await send_grouped(bot, chat_id, today_msk)
+    await send_grouped(bot, chat_id, today_msk())
+
+async def _render_for_broadcast(target: date, profile: str) -> list[str]:
+    """
+    Рендер для рассылки: неполный ответ всем подписчикам не уходит — ждём сайт ещё BROADCAST_RETRIES раз.
+    Загрузка, которую прервал таймаут, продолжается в фоне, так что повтор обычно забирает её результат.
+    """
+    texts, complete = await render_grouped(target, profile)
+    for attempt in range(BROADCAST_RETRIES):
+        if complete:
+            break
+        metrics.incr("broadcast_retries")
+        print(f"[broadcast] {target} profile {profile}: ответ неполный, повтор {attempt + 1} через {BROADCAST_RETRY_DELAY:.0f} с")
+        await asyncio.sleep(BROADCAST_RETRY_DELAY)
+        texts, complete = await render_grouped(target, profile)
+    if not complete:
+        metrics.incr("broadcast_incomplete")
+        print(f"[broadcast] {target} profile {profile}: сайт так и не ответил, отправляем что есть")
+    return texts
 
 async def broadcast_daily(bot: Bot):
-    for chat_id in list(CHAT_IDS):
+    """Один рендер на профиль, дальше — одинаковый текст всей группе."""
+    target = today_msk()
+    for profile, chat_ids in group_by_profile(CHAT_IDS, PREFS).items():
+        if profile == "custom" and not any(p.fetch(target) for p in CUSTOM_PROVIDERS):
+            metrics.incr("broadcast_skipped_empty")  # «• —» каждое утро никому не нужно
+            continue
         try:
-            await send_today(bot, chat_id)
+            texts = await _render_for_broadcast(target, profile)
         except Exception as e:
-            print(f"[broadcast] chat {chat_id} error: {e}")
+            print(f"[broadcast] profile {profile} render error: {e}")
+            continue
+        metrics.incr("broadcast_renders")
+        for chat_id in chat_ids:
+            try:
+                await _send_texts(bot, chat_id, texts)
+                metrics.incr("broadcast_sent")
+            except Exception as e:
+                print(f"[broadcast] chat {chat_id} error: {e}")
+
+async def compact_subs():
+    """Сжатие журнала подписок: subs.bin пишется в потоке, не во время рассылки."""
+    if CHAT_IDS.needs_compaction():
+        with metrics.timed("subs_compaction"):
+            await CHAT_IDS.compact_async()
 
 # --- Хендлеры ---
+INLINE_START = "inline"  # deep link кнопки «⏳ Загружаю…» из inline-режима
+
+@dp.message(CommandStart(deep_link=True, magic=F.args == INLINE_START))
+async def inline_start_handler(message: Message):
+    """Пришли из inline-кнопки: объясняем и ничего не включаем — подписка только по явной просьбе."""
+    await message.answer(
+        "Дата загружается — через пару секунд снова наберите @-запрос в нужном чате, "
+        "праздники уже будут готовы.\n\nЕжедневная рассылка не включена: "
+        "если нужна — кнопка «🔔 Подписаться».",
+        reply_markup=MAIN_KB,
+    )
+
 @dp.message(CommandStart())
-async def start_handler(message: Message):
-    add_sub(CHAT_IDS, message.chat.id)
+async def start_handler(message: Message, command: CommandObject):
+    if not command.args:  # /start с параметром — переход по ссылке, а не просьба подписаться
+        add_sub(CHAT_IDS, message.chat.id)
     await message.answer(
         "Привет! Я включён ✅\n\n"
         "Нажимай кнопки снизу:\n"
         "• 📆 Сегодня — показать праздники\n"
-        "• 🔎 Поиск по дате — 4 ноября / 21.01\n"
+        "• 🔎 Поиск по дате — 4 ноября / 21.01 / завтра\n"
         "• 🔔 Подписаться — включить рассылку (09:00 МСК)\n"
         "• 🔕 Отписаться — отключить рассылку\n"
-        "• ➕ Добавить праздник — добавить свой повод",
+        "• ➕ Добавить праздник — добавить свой повод\n"
+        "• ⚙️ Что присылать — все страны / только Россия / только свои\n"
+        "• /find день программиста — найти праздник по названию\n"
+        "• /ical 2026 — календарь праздников файлом .ics\n"
+        "• /export_custom — свои праздники файлом",
         reply_markup=MAIN_KB,
     )
 
@@ -165,7 +424,7 @@ async def unsubscribe_handler(message: Message):
     remove_sub(CHAT_IDS, message.chat.id)
     await message.answer("Подписка отключена 📴")
 
-@dp.message(F.text.lower().in_({"сегодня", "📆 сегодня"}))
+@dp.message(F.text.lower().in_({"сегодня", "📆 сегодня"}), flags={"lookup": "today"})
 async def today_btn(message: Message):
     await send_today(message.bot, message.chat.id)
 
@@ -179,6 +438,227 @@ async def unsubscribe_btn(message: Message):
     remove_sub(CHAT_IDS, message.chat.id)
     await message.answer("Подписка отключена 📴")
 
+async def ask_mode(message: Message):
+    current = PREFS.get(message.chat.id, DEFAULT_PROFILE)
+    await message.answer(
+        f"Сейчас присылаю: {PROFILE_NAMES[current]}.\nВыберите, что присылать:",
+        reply_markup=PROFILE_KB,
+    )
+
+async def save_mode(message: Message, profile: str):
+    set_pref(PREFS, message.chat.id, profile)
+    await message.answer(f"Готово, буду присылать: {PROFILE_NAMES[profile]} ✅", reply_markup=MAIN_KB)
+
+@dp.message(Command("mode"))
+async def mode_handler(message: Message, command: CommandObject):
+    profile = PROFILE_ARGS.get((command.args or "").strip().lower())
+    if not profile:
+        await ask_mode(message)
+        return
+    await save_mode(message, profile)
+
+@dp.message(F.text.lower().in_({"что присылать", "⚙️ что присылать"}))
+async def mode_btn(message: Message):
+    await ask_mode(message)
+
+@dp.message(F.text.lower().in_(set(PROFILE_BUTTONS)))
+async def mode_choice(message: Message):
+    await save_mode(message, PROFILE_BUTTONS[message.text.lower()])
+
+@dp.message(Command("stats"))
+async def stats_handler(message: Message):
+    await message.answer(metrics.report())
+
+# --- Поиск по названию ---
+def rebuild_search_index():
+    HOLIDAY_INDEX.clear()
+    for day, items in holidays.cached_days():
+        HOLIDAY_INDEX.add_day(day, items)
+    for rec in all_custom():
+        HOLIDAY_INDEX.add_custom(rec)
+    today = today_msk()
+    for p in LOCAL_PROVIDERS:
+        try:
+            entries = p.entries()
+        except Exception as e:
+            print(f"[find] {p.name} не проиндексирован: {e}")
+            continue
+        for key, item in entries:
+            when = providers.entry_date(key, today)
+            if when:
+                HOLIDAY_INDEX.add_day(when[0], [item], repeat=when[1])
+
+
+_CRAWL_LOCK = asyncio.Lock()
+
+
+async def crawl_year():
+    """
+    Обходит CRAWL_DAYS дней вперёд, чтобы /find знал весь год, а не только открытые дни.
+    Только страницы дней (названия и ссылки) — по одной загрузке в CRAWL_DELAY секунд;
+    дни, уже лежащие в памяти, индексируются без сети и без паузы.
+    """
+    if CALEND is None or CRAWL_DAYS <= 0 or _CRAWL_LOCK.locked():
+        return
+    async with _CRAWL_LOCK:
+        await _crawl(today_msk())
+
+
+async def _crawl(today: date) -> None:
+    loop = asyncio.get_running_loop()
+    for i in range(CRAWL_DAYS):
+        day = today + timedelta(days=i)
+        cached = holidays.has_day_items(day)
+        try:
+            items = await loop.run_in_executor(providers.CALEND_POOL, get_day_items, day)
+        except Exception as e:
+            print(f"[crawl] {day}: {e}")
+            items = []
+        HOLIDAY_INDEX.add_day(day, items)
+        if not cached:
+            metrics.incr("crawl_days")
+            await asyncio.sleep(CRAWL_DELAY)
+
+
+async def refresh_search_index():
+    """Раз в сутки: индекс заново (свежие локальные файлы), потом обход года со сдвигом окна."""
+    if _CRAWL_LOCK.locked():  # прошлый обход ещё идёт — не сбрасываем то, что он уже набрал
+        return
+    rebuild_search_index()
+    await crawl_year()
+
+
+holidays.on_day_scraped(HOLIDAY_INDEX.add_day)
+custom_holidays.on_added(HOLIDAY_INDEX.add_custom)
+
+
+def html_found(found: list[dict]) -> str:
+    lines = []
+    for d in found:
+        when = format_day(d["dates"][-1])
+        if d["custom"]:
+            if d["repeat"] != "annual":
+                when = d["dates"][-1].strftime("%d.%m.%Y")
+            lines.append(f"• (своё) <b>{d['title']}</b> — {when}")
+        else:
+            lines.append(f"• {html_title(d)} — {when}")
+    return "\n".join(lines)
+
+@dp.message(Command("find"))
+async def find_handler(message: Message, command: CommandObject):
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Что искать? Например: /find день программиста")
+        return
+    with metrics.timed("find"):
+        found = HOLIDAY_INDEX.search(query)
+    if not found:
+        await message.answer("Ничего не нашёл 🤷 Ищу по праздникам на год вперёд и своим.")
+        return
+    await message.answer(
+        "<b>🔍 Нашлось:</b>\n" + html_found(found),
+        parse_mode="HTML",
+        disable_web_page_preview=True,
+    )
+
+# --- Экспорт в календарь (.ics) ---
+MAX_ICAL_DAYS = 3 * 366
+
+class StreamingFile(InputFile):
+    """Файл для отправки, который собирается из генератора строк по мере выгрузки."""
+
+    def __init__(self, lines, filename: str):
+        super().__init__(filename=filename)
+        self.lines = lines
+
+    async def read(self, bot: Bot):
+        buf, size = [], 0
+        for line in self.lines:
+            chunk = line.encode("utf-8")
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= self.chunk_size:
+                yield b"".join(buf)
+                buf, size = [], 0
+        if buf:
+            yield b"".join(buf)
+
+def local_ical_records(start: date) -> list[dict]:
+    """Записи локальных наборов для iter_ical: «ММ-ДД» — ежегодно с первого раза не раньше start."""
+    records = []
+    for p in LOCAL_PROVIDERS:
+        try:
+            entries = p.entries()
+        except Exception as e:
+            print(f"[ical] {p.name} пропущен: {e}")
+            continue
+        for key, item in entries:
+            when = providers.entry_date(key, start)
+            if when:
+                records.append({
+                    "date": when[0].isoformat(), "title": item["title"], "repeat": when[1],
+                    "desc": item.get("desc", ""), "url": item.get("url", ""),
+                })
+    return records
+
+@dp.message(Command("ical"))
+async def ical_handler(message: Message, command: CommandObject):
+    rng = parse_ical_range(command.args or "")
+    if not rng:
+        year = today_msk().year
+        await message.answer(
+            "Формат: /ical, /ical 2026, /ical 4 ноября или /ical 01.11 - 30.11\n"
+            f"Годы — с {year - ICAL_YEARS_AROUND} по {year + ICAL_YEARS_AROUND}."
+        )
+        return
+    start, end = rng
+    if (end - start).days >= MAX_ICAL_DAYS:
+        await message.answer("Слишком большой диапазон — не больше трёх лет.")
+        return
+    name = f"holidays_{start:%Y%m%d}_{end:%Y%m%d}.ics"
+    await message.answer_document(
+        StreamingFile(iter_ical(start, end, all_custom(), local_ical_records(start)), filename=name),
+        caption="📅 Праздники из уже загруженных дней, локального набора и свои. Импортируйте файл в календарь.",
+    )
+
+# --- Массовый импорт / экспорт своих праздников ---
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+
+def _import_document(filename: str, raw: bytes) -> dict:
+    # в потоке: слушателей (поисковый индекс) зовём уже из цикла
+    return import_rows(parse_document(filename, raw), notify=False)
+
+def is_admin(message: Message) -> bool:
+    return message.chat.id in ADMIN_IDS or bool(message.from_user and message.from_user.id in ADMIN_IDS)
+
+@dp.message(F.document.file_name.lower().endswith((".csv", ".json")))
+async def import_custom_handler(message: Message):
+    # свои праздники общие и уходят в рассылку всем — массово добавлять их могут только админы
+    if not is_admin(message):
+        await message.answer("Импорт файлом доступен только администраторам бота. Один праздник — кнопкой «➕ Добавить праздник».")
+        return
+    doc = message.document
+    if doc.file_size and doc.file_size > MAX_IMPORT_BYTES:
+        await message.answer("Файл слишком большой — не больше 5 МБ.")
+        return
+    buf = io.BytesIO()
+    await message.bot.download(doc, destination=buf)
+    try:
+        report = await asyncio.to_thread(_import_document, doc.file_name, buf.getvalue())
+    except Exception as e:  # битый JSON/CSV/кодировка целиком
+        await message.answer(f"📥 Импорт своих праздников\nНе удалось разобрать файл: {e}")
+        return
+    custom_holidays.notify_added(report["records"])
+    await message.answer("📥 Импорт своих праздников\n" + format_report(report))
+
+@dp.message(Command("export_custom"))
+async def export_custom_handler(message: Message, command: CommandObject):
+    fmt = "json" if (command.args or "").strip().lower() == "json" else "csv"
+    await message.answer_document(
+        StreamingFile(iter_export(fmt), filename=f"custom_holidays.{fmt}"),
+        caption="Свои праздники. Этот же файл можно прислать обратно для импорта.",
+    )
+
 # --- Мастер «Добавить праздник» ---
 @dp.message(F.text.lower().in_({"➕ добавить праздник", "добавить праздник"}))
 async def add_holiday_start(message: Message, state: FSMContext):
@@ -235,34 +715,176 @@ async def add_holiday_finish(message: Message, state: FSMContext):
 async def search_by_date_start(message: Message, state: FSMContext):
     await state.set_state(SearchByDate.waiting_date)
     await message.answer(
-        "Введите дату (4 ноября / 21.01):",
+        "Введите дату (4 ноября / 21.01 / завтра / пятница):",
         reply_markup=ReplyKeyboardRemove(),
     )
 
-@dp.message(SearchByDate.waiting_date)
+@dp.message(SearchByDate.waiting_date, flags={"lookup": "date"})
 async def search_by_date_finish(message: Message, state: FSMContext):
     text = (message.text or "").strip()
-    dt = parse_ru_day_month(text) or parse_ddmm(text)
-    if not dt:
-        await message.answer("Не понимаю формат. Введите «4 ноября» или «21.01».")
+    target = parse_date(text)
+    if not target:
+        await message.answer("Не понимаю формат. Введите «4 ноября», «21.01» или «завтра».")
         return
-    target = dt.date()
     await send_grouped(message.bot, message.chat.id, target)
     await state.clear()
 
 # --- Фоллбек: просто прислали дату текстом ---
-@dp.message(F.text)
+@dp.message(F.text, flags={"lookup": "date"})
 async def fallback_date_parser(message: Message):
-    dt = parse_ru_day_month(message.text) or parse_ddmm(message.text)
-    if not dt:
+    target = parse_date(message.text)
+    if not target:
+        return
+    await send_grouped(message.bot, message.chat.id, target)
+
+# --- Inline-режим: «@bot 4 ноября» в любом чате ---
+INLINE_CACHE_TIME = 3600      # сек; Telegram кэширует ответ у себя
+INLINE_MISS_CACHE_TIME = 10   # дата ещё не скачана — пусть скоро спросит снова
+INLINE_WARM_DELAY = 1.5       # сек тишины после набора: «21.01» по пути к «21.01.2025» не качаем
+
+# дата -> (версия локальных источников, готовые результаты)
+_INLINE: dict[date, tuple[int, list[InlineQueryResultArticle]]] = {}
+_INLINE_WARMING: set[date] = set()
+# user_id -> отложенная загрузка; новый запрос пользователя заменяет прежний
+_INLINE_PENDING: dict[int, asyncio.Task] = {}
+_BG_TASKS: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    """create_task, который не потеряется сборщиком мусора."""
+    task = asyncio.create_task(coro)
+    _BG_TASKS.add(task)
+    task.add_done_callback(_BG_TASKS.discard)
+    return task
+
+
+def _article(result_id: str, title: str, text: str, description: str = "") -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description[:100] or None,
+        input_message_content=InputTextMessageContent(
+            message_text=text,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        ),
+    )
+
+
+def inline_results(target: date) -> list[InlineQueryResultArticle] | None:
+    """Результаты для inline-ответа только из кэшей; None — дату ещё не скачивали."""
+    version = providers.data_version(PROVIDERS)
+    hit = _INLINE.get(target)
+    if hit and hit[0] == version:
+        return hit[1]
+
+    cached = render_cached(target)
+    if cached is None:
+        return None
+    texts, details = cached
+    day = format_day(target)
+    prefix = target.strftime("%Y%m%d")
+
+    results = [_article(f"{prefix}-rus", f"🇷🇺 Праздники России — {day}", texts[0])]
+    if len(texts) > 1:
+        results.append(_article(f"{prefix}-other", f"🌍 Другие праздники — {day}", texts[1]))
+    # по одному празднику, чтобы можно было отправить конкретный (лимит Telegram — 50)
+    for i, d in enumerate(details[: 50 - len(results)]):
+        text = html_title(d)
+        if d.get("desc"):
+            text += f"\n<i>{d['desc']}</i>"
+        results.append(_article(f"{prefix}-{i}", d["title"], text, d.get("desc", "")))
+
+    _INLINE[target] = (version, results)
+    return results
+
+
+async def warm_date(target: date) -> None:
+    """Скачивает дату в фоне, не блокируя цикл; параллельные запросы одной даты склеиваются."""
+    if target in _INLINE_WARMING:
         return
-    await send_grouped(message.bot, message.chat.id, dt.date())
+    _INLINE_WARMING.add(target)
+    try:
+        await render_grouped(target)
+        inline_results(target)
+    except Exception as e:
+        print(f"[inline] warm {target} error: {e}")
+    finally:
+        _INLINE_WARMING.discard(target)
+
+
+async def _warm_for_user(user_id: int, target: date) -> None:
+    """Загрузка по inline-запросу: после паузы в наборе и в пределах бакета пользователя."""
+    await asyncio.sleep(INLINE_WARM_DELAY)
+    _INLINE_PENDING.pop(user_id, None)  # дальше не отменяем — загрузку могут ждать другие
+    if target in _INLINE_WARMING or not LOOKUP_THROTTLE.allow(user_id):
+        return
+    await warm_date(target)
+
+
+def _cancel_warm(user_id: int) -> None:
+    """Пользователь печатает дальше — отложенная загрузка прежнего текста больше не нужна (debounce)."""
+    pending = _INLINE_PENDING.pop(user_id, None)
+    if pending is not None:
+        pending.cancel()
+
+
+async def precompute_inline():
+    today = today_msk()
+    for target in (today, today + timedelta(days=1)):
+        await warm_date(target)
+    for d in [d for d in _INLINE if d < today]:
+        del _INLINE[d]
+    prune_rendered(today)
+
+
+@dp.inline_query()
+async def inline_handler(query: InlineQuery):
+    _cancel_warm(query.from_user.id)
+    text = query.query.strip()
+    target = parse_date(text) if text else today_msk()
+    if not target:
+        await query.answer([], cache_time=INLINE_CACHE_TIME)
+        return
+
+    results = inline_results(target)
+    if results is None:
+        # живой парсинг на каждое нажатие клавиши не делаем: одна фоновая загрузка на дату,
+        # когда пользователь допечатал, и не чаще, чем позволяет его бакет
+        _INLINE_PENDING[query.from_user.id] = _spawn(_warm_for_user(query.from_user.id, target))
+        await query.answer(
+            [],
+            cache_time=INLINE_MISS_CACHE_TIME,
+            button=InlineQueryResultsButton(text=f"⏳ Загружаю {format_day(target)}…", start_parameter=INLINE_START),
+        )
+        return
+    await query.answer(results, cache_time=INLINE_CACHE_TIME)
 
 # --- Запуск ---
+@dp.startup()
+async def on_startup():
+    metrics.observe("startup", metrics.uptime())
+    print(f"[startup] готов к polling за {metrics.uptime():.2f} с")
+    FSM_STORAGE.start()
+    _spawn(precompute_inline())
+    _spawn(crawl_year())
+
+@dp.shutdown()
+async def on_shutdown():
+    size = await snapshot.save_snapshot_async()
+    print(f"[snapshot] сохранён при остановке ({size} байт)")
+
 async def main():
+    if snapshot.load_snapshot():
+        print(f"[snapshot] кэши подняты из {snapshot.SNAPSHOT_FILE}")
+    rebuild_search_index()
     bot = Bot(token=TOKEN)
     scheduler = AsyncIOScheduler(timezone=pytz.timezone("Europe/Moscow"))
     scheduler.add_job(broadcast_daily, "cron", hour=9, minute=0, args=[bot])
+    scheduler.add_job(snapshot.save_snapshot_async, "interval", minutes=15)
+    scheduler.add_job(precompute_inline, "cron", hour=0, minute=1)
+    scheduler.add_job(compact_subs, "interval", minutes=1)
+    scheduler.add_job(refresh_search_index, "cron", hour=3, minute=0)
     scheduler.start()
     await dp.start_polling(bot)
 
@@ -0,0 +1,116 @@
+# classify.py
+import json
+import re
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Set
+
+# Своя таблица кладётся в categories.json ({"тег": ["ключ", ...]}) и целиком заменяет эту.
+# Ключи ищутся как подстроки; пробел по краям ключа означает границу слова (" сша ").
+CATEGORIES_FILE = Path("categories.json")
+
+DEFAULT_KEYWORDS: Dict[str, List[str]] = {
+    "russia": ["росси"],  # Россия/России/российский…
+    "belarus": ["беларус", "белорус"],
+    "ukraine": ["украин"],
+    "kazakhstan": ["казахстан"],
+    "usa": [" сша ", "америк"],
+    "international": ["международн", "всемирн", " оон ", "юнеско"],
+    "religious": ["православ", "церков", "святого", "святой", "святых", "христ", "мусульман", "иудей"],
+    "professional": ["профессиональн", "работник", "специалист"],
+}
+
+TAG_LABELS = {
+    "russia": "🇷🇺",
+    "belarus": "🇧🇾",
+    "ukraine": "🇺🇦",
+    "kazakhstan": "🇰🇿",
+    "usa": "🇺🇸",
+    "international": "🌐",
+    "religious": "⛪",
+    "professional": "🛠",
+}
+
+_NON_WORD_RE = re.compile(r"[^0-9a-zа-я]+")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, всё кроме букв/цифр -> пробел, пробелы по краям."""
+    return " " + _NON_WORD_RE.sub(" ", (text or "").lower().replace("ё", "е")).strip() + " "
+
+
+class KeywordMatcher:
+    """
+    Автомат Ахо–Корасик: все ключи всех тегов ищутся за один проход по тексту,
+    время не зависит от размера таблицы.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Set[str]] = [set()]
+        for tag, words in keywords.items():
+            for word in words:
+                self._insert(word.lower().replace("ё", "е"), tag)
+        self._build_fail_links()
+
+    def _insert(self, word: str, tag: str) -> None:
+        if not word:
+            return
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            node = nxt
+        self._out[node].add(tag)
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def match(self, text: str) -> Set[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[str] = set()
+        node = 0
+        for ch in normalize(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+
+def load_keywords() -> Dict[str, List[str]]:
+    if CATEGORIES_FILE.exists():
+        try:
+            return json.loads(CATEGORIES_FILE.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"[classify] {CATEGORIES_FILE} не прочитан, беру встроенную таблицу: {e}")
+    return DEFAULT_KEYWORDS
+
+
+_MATCHER = KeywordMatcher(load_keywords())
+
+
+def reload() -> None:
+    global _MATCHER
+    _MATCHER = KeywordMatcher(load_keywords())
+
+
+def classify(title: str, desc: str = "") -> List[str]:
+    """Теги праздника (страны/категории) по названию и описанию, отсортированы."""
+    return sorted(_MATCHER.match(f"{title} {desc}"))
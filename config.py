@@ -10,3 +10,36 @@ if not TOKEN:
     raise RuntimeError(
         "BOT_TOKEN is not set. Define it in environment (or in a .env file) before running the bot."
 )
+
+# Прогрессивный ответ: сколько секунд ждать описаний, прежде чем показать то, что есть
+PROGRESSIVE_BUDGET = float(os.getenv("PROGRESSIVE_BUDGET", "8"))
+
+# FSM (мастера «Добавить праздник» / «Поиск по дате»): сколько живёт брошенное состояние и сколько их держать
+FSM_TTL = int(os.getenv("FSM_TTL", str(30 * 60)))
+FSM_MAX_STATES = int(os.getenv("FSM_MAX_STATES", "50000"))
+
+# Ограничение поиска праздников на чат: LOOKUP_BURST подряд, дальше один раз в LOOKUP_REFILL секунд;
+# та же дата в том же чате чаще, чем раз в LOOKUP_DEDUPE секунд, не ищется
+LOOKUP_BURST = int(os.getenv("LOOKUP_BURST", "5"))
+LOOKUP_REFILL = float(os.getenv("LOOKUP_REFILL", "10"))
+LOOKUP_DEDUPE = float(os.getenv("LOOKUP_DEDUPE", "30"))
+
+# Источники праздников (providers.py): HOLIDAYS_OFFLINE=1 — без calend.ru, только локальные;
+# HOLIDAYS_LOCAL_FILE — свой набор (.json или база SQLite); CALEND_TIMEOUT — сколько секунд ждать сайт
+HOLIDAYS_OFFLINE = os.getenv("HOLIDAYS_OFFLINE", "").strip().lower() in ("1", "true", "yes", "on")
+HOLIDAYS_LOCAL_FILE = os.getenv("HOLIDAYS_LOCAL_FILE", "").strip()
+CALEND_TIMEOUT = float(os.getenv("CALEND_TIMEOUT", "30"))
+
+# Утренняя рассылка не уходит с неполным ответом: если calend.ru не успел, ещё BROADCAST_RETRIES
+# попыток с паузой BROADCAST_RETRY_DELAY сек; после них отправляем то, что есть
+BROADCAST_RETRIES = int(os.getenv("BROADCAST_RETRIES", "5"))
+BROADCAST_RETRY_DELAY = float(os.getenv("BROADCAST_RETRY_DELAY", "120"))
+
+# Кто может присылать боту .csv/.json для массового импорта своих праздников (chat_id или user_id
+# через запятую). Пусто — импорт только из консоли: python custom_holidays.py import file.csv
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(",", " ").split()}
+
+# Фоновый обход calend.ru для /find: сколько дней вперёд и пауза между загрузками страниц дня (сек).
+# CRAWL_DAYS=0 — не обходить, искать только по уже открытым дням
+CRAWL_DAYS = int(os.getenv("CRAWL_DAYS", "366"))
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "3"))
@@ -1,11 +1,32 @@
 # custom_holidays.py
+import argparse
+import csv
+import io
 import json
+import os
+import sys
+import threading
 from pathlib import Path
 from datetime import date, datetime
-from typing import List, Dict
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple
 
 CUSTOM_FILE = Path("custom_holidays.json")
 
+# вызываются с новой записью после успешного add_custom
+_LISTENERS: List[Callable[[Dict], None]] = []
+# чтение-изменение-запись файла: add_custom идёт в цикле бота, импорт — в потоке
+_WRITE_LOCK = threading.Lock()
+
+
+def on_added(fn: Callable[[Dict], None]) -> None:
+    _LISTENERS.append(fn)
+
+
+def notify_added(records: Iterable[Dict]) -> None:
+    for rec in records:
+        for fn in _LISTENERS:
+            fn(rec)
+
 
 def _read() -> List[Dict]:
     if CUSTOM_FILE.exists():
@@ -17,7 +38,42 @@ def _read() -> List[Dict]:
 
 
 def _write(rows: List[Dict]) -> None:
-    CUSTOM_FILE.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    """Атомарная запись: сначала во временный файл, потом rename поверх."""
+    tmp = CUSTOM_FILE.with_name(CUSTOM_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, CUSTOM_FILE)
+
+
+REPEAT_ALIASES = {
+    "annual": "annual", "yearly": "annual", "ежегодно": "annual", "да": "annual", "yes": "annual", "1": "annual",
+    "once": "once", "один раз": "once", "однократно": "once", "нет": "once", "no": "once", "0": "once", "": "once",
+}
+
+
+def _parse_day(date_str: str) -> date:
+    date_str = (date_str or "").strip()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Неверная дата «{date_str}», нужно YYYY-MM-DD или ДД.ММ.ГГГГ")
+
+
+def _make_record(date_str: str, title: str, repeat: str = "once") -> Dict:
+    """Валидация и нормализация одной записи; ValueError с понятным текстом."""
+    d = _parse_day(date_str)
+    title = (title or "").strip()
+    if not title:
+        raise ValueError("Пустое название")
+    repeat = REPEAT_ALIASES.get((repeat or "").strip().lower())
+    if repeat is None:
+        raise ValueError("Повтор должен быть annual или once")
+    return {"date": d.isoformat(), "title": title, "repeat": repeat}
+
+
+def _key(rec: Dict) -> tuple:
+    return rec["date"], rec["title"].lower()
 
 
 def add_custom(date_str: str, title: str, repeat: str = "once") -> Dict:
@@ -27,45 +83,219 @@ def add_custom(date_str: str, title: str, repeat: str = "once") -> Dict:
     title: короткое название
     repeat: 'annual' или 'once'
     """
-    # валидация даты и нормализация
     d = datetime.strptime(date_str, "%Y-%m-%d").date()
-    title = (title or "").strip()
-    if not title:
-        raise ValueError("Пустое название")
+    rec = _make_record(d.isoformat(), title, "annual" if repeat == "annual" else "once")
 
-    repeat = "annual" if repeat == "annual" else "once"
+    with _WRITE_LOCK:
+        rows = _read()
+        # дедуп по дате+названию
+        for r in rows:
+            if _key(r) == _key(rec):
+                return r  # уже есть — просто возвращаем
 
-    rows = _read()
-    rec = {"date": d.isoformat(), "title": title, "repeat": repeat}
+        rows.append(rec)
+        _write(rows)
+    notify_added([rec])
+    return rec
 
-    # дедуп по дате+названию
-    for r in rows:
-        if r["date"] == rec["date"] and r["title"].lower() == rec["title"].lower():
-            return r  # уже есть — просто возвращаем
 
-    rows.append(rec)
-    _write(rows)
-    return rec
+def all_custom() -> List[Dict]:
+    return _read()
 
 
-def get_for_date(day: date) -> List[str]:
+# -------------------- массовый импорт / экспорт --------------------
+
+def parse_csv(text: str) -> Iterator[Tuple[int, Dict]]:
     """
-    Возвращает список названий праздников на конкретную дату,
-    учитывая ежегодные повторы.
+    CSV с колонками date,title[,repeat] (заголовок необязателен, разделитель , или ;).
+    Отдаёт (номер строки, сырые поля).
+    """
+    sample = text[:2048]
+    dialect = csv.Sniffer().sniff(sample, delimiters=",;") if sample.strip() else csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+    for line_no, row in enumerate(reader, 1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if line_no == 1 and row[0].strip().lower() in ("date", "дата"):
+            continue
+        row += [""] * (3 - len(row))
+        yield line_no, {"date": row[0], "title": row[1], "repeat": row[2]}
+
+
+def parse_json(text: str) -> Iterator[Tuple[int, Dict]]:
+    """JSON-массив объектов {date, title, repeat} (как в custom_holidays.json)."""
+    data = json.loads(text)
+    if not isinstance(data, list):
+        raise ValueError("Ожидается JSON-массив записей")
+    for i, row in enumerate(data, 1):
+        yield i, row if isinstance(row, dict) else {}
+
+
+def parse_document(filename: str, raw: bytes) -> Iterator[Tuple[int, Dict]]:
+    text = raw.decode("utf-8-sig")
+    if filename.lower().endswith(".json") or text.lstrip().startswith("["):
+        return parse_json(text)
+    return parse_csv(text)
+
+
+def import_rows(rows: Iterable[Tuple[int, Dict]], notify: bool = True) -> Dict:
+    """
+    Проверяет и добавляет записи за один проход: дедуп по множеству ключей (дата+название)
+    против файла и внутри самой пачки, одна атомарная запись в конце.
+    Отчёт: {"added", "duplicates", "errors": [(номер строки, текст ошибки)], "records": новые записи}.
+    notify=False — слушателей не звать (импорт в потоке; бот позовёт notify_added из своего цикла).
     """
+    records: List[Dict] = []
+    errors: List[Tuple[int, str]] = []
+    for line_no, raw in rows:
+        try:
+            records.append(_make_record(str(raw.get("date", "")), str(raw.get("title", "")), str(raw.get("repeat", ""))))
+        except ValueError as e:
+            errors.append((line_no, str(e)))
+
+    added: List[Dict] = []
+    duplicates = 0
+    with _WRITE_LOCK:
+        existing = _read()
+        keys = {_key(r) for r in existing if "date" in r and "title" in r}
+        for rec in records:
+            if _key(rec) in keys:
+                duplicates += 1
+                continue
+            keys.add(_key(rec))
+            added.append(rec)
+        if added:
+            _write(existing + added)
+    if notify:
+        notify_added(added)
+    return {"added": len(added), "duplicates": duplicates, "errors": errors, "records": added}
+
+
+def format_report(report: Dict, max_errors: int = 10) -> str:
+    lines = [
+        f"Добавлено: {report['added']}",
+        f"Уже были: {report['duplicates']}",
+        f"С ошибками: {len(report['errors'])}",
+    ]
+    errors = report["errors"]
+    if errors:
+        # одинаковые ошибки сворачиваем, чтобы тысяча кривых строк не превратилась в тысячу строк отчёта
+        by_text: Dict[str, List[int]] = {}
+        for line_no, text in errors:
+            by_text.setdefault(text, []).append(line_no)
+        for text, line_nos in list(by_text.items())[:max_errors]:
+            shown = ", ".join(map(str, line_nos[:5])) + (" …" if len(line_nos) > 5 else "")
+            lines.append(f"  • {text} (строки {shown}; всего {len(line_nos)})")
+        if len(by_text) > max_errors:
+            lines.append(f"  • … и ещё {len(by_text) - max_errors} видов ошибок")
+    return "\n".join(lines)
+
+
+def iter_export(fmt: str = "csv") -> Iterator[str]:
+    """Все записи построчно — CSV (date,title,repeat) или JSON-массив."""
     rows = _read()
-    out = []
+    if fmt == "json":
+        yield "[\n"
+        for i, r in enumerate(rows):
+            yield ("  " if i == 0 else ",\n  ") + json.dumps(r, ensure_ascii=False)
+        yield "\n]\n"
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["date", "title", "repeat"])
+    for r in rows:
+        writer.writerow([r.get("date", ""), r.get("title", ""), r.get("repeat", "once")])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _mtime() -> int:
+    try:
+        return CUSTOM_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _build_index(rows: List[Dict], mtime: int) -> Dict:
+    annual: Dict[str, List[str]] = {}
+    once: Dict[str, List[str]] = {}
     for r in rows:
         try:
             d = datetime.strptime(r["date"], "%Y-%m-%d").date()
         except Exception:
             continue
-
+        title = r.get("title", "")
+        if not title:
+            continue
         if r.get("repeat") == "annual":
-            if (d.month, d.day) == (day.month, day.day):
-                out.append(r.get("title", ""))
+            annual.setdefault(d.strftime("%m-%d"), []).append(title)
         else:
-            if d == day:
-                out.append(r.get("title", ""))
+            once.setdefault(d.isoformat(), []).append(title)
+    return {"mtime": mtime, "annual": annual, "once": once}
+
+
+# разобранный custom_holidays.json: {"mtime", "annual": {"MM-DD": [...]}, "once": {"YYYY-MM-DD": [...]}}
+_INDEX: Dict | None = None
+
+
+def _index() -> Dict:
+    """Индекс перечитывается, только если файл изменился."""
+    global _INDEX
+    mtime = _mtime()
+    if _INDEX is None or _INDEX["mtime"] != mtime:
+        _INDEX = _build_index(_read(), mtime)
+    return _INDEX
+
+
+def version() -> int:
+    """Меняется при каждом изменении файла — годится как ключ кэшей."""
+    return _index()["mtime"]
+
+
+def export_cache() -> Dict:
+    return _index()
+
+
+def import_cache(data: Dict) -> None:
+    global _INDEX
+    if data and data.get("mtime") == _mtime():
+        _INDEX = data
+
+
+def get_for_date(day: date) -> List[str]:
+    """
+    Возвращает список названий праздников на конкретную дату,
+    учитывая ежегодные повторы.
+    """
+    idx = _index()
+    return idx["annual"].get(day.strftime("%m-%d"), []) + idx["once"].get(day.isoformat(), [])
+
+
+def main(argv: List[str] | None = None) -> None:
+    """python custom_holidays.py import rows.csv | export [--format json] [-o out.csv]"""
+    ap = argparse.ArgumentParser(description="Массовый импорт/экспорт своих праздников")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="добавить записи из CSV/JSON")
+    imp.add_argument("path")
+    exp = sub.add_parser("export", help="выгрузить все записи")
+    exp.add_argument("--format", choices=("csv", "json"), default="csv")
+    exp.add_argument("-o", "--output", help="файл (по умолчанию — stdout)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "import":
+        path = Path(args.path)
+        print(format_report(import_rows(parse_document(path.name, path.read_bytes()))))
+        return
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in iter_export(args.format):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
 
-    return [t for t in out if t]
+if __name__ == "__main__":
+    main()
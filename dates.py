@@ -0,0 +1,157 @@
+# dates.py
+import datetime
+import re
+from zoneinfo import ZoneInfo
+
+MSK = ZoneInfo("Europe/Moscow")
+
+RU_MONTHS_GEN = (
+    "января", "февраля", "марта", "апреля", "мая", "июня",
+    "июля", "августа", "сентября", "октября", "ноября", "декабря",
+)
+
+# родительный падеж («4 ноября») и именительный («4 ноябрь»)
+RU_MONTHS = {
+    **{name: i for i, name in enumerate(RU_MONTHS_GEN, 1)},
+    "январь": 1, "февраль": 2, "март": 3, "апрель": 4, "май": 5, "июнь": 6,
+    "июль": 7, "август": 8, "сентябрь": 9, "октябрь": 10, "ноябрь": 11, "декабрь": 12,
+}
+
+# именительный и винительный падеж («в среду»)
+RU_WEEKDAYS = {
+    "понедельник": 0, "вторник": 1, "среда": 2, "среду": 2, "четверг": 3,
+    "пятница": 4, "пятницу": 4, "суббота": 5, "субботу": 5, "воскресенье": 6,
+}
+
+RELATIVE_DAYS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+
+# одна регулярка на все форматы — проверяется целиком за один проход
+INPUT_DATE_RE = re.compile(
+    r"(?P<num_d>\d{1,2})[.\-/](?P<num_m>\d{1,2})(?:[.\-/](?P<num_y>\d{4}))?"
+    r"|(?P<txt_d>\d{1,2})\s+(?P<txt_m>[а-яё]+)(?:\s+(?P<txt_y>\d{4})(?:\s*г(?:ода?|\.)?)?)?"
+    r"|через\s+(?P<shift>\d{1,3})\s+(?:день|дня|дней)"
+    r"|(?:во?\s+)?(?P<word>[а-яё]+)"
+)
+
+# дата внутри заголовка RSS: «… 4 ноября 2025 …»
+TITLE_DATE_RE = re.compile(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})", re.IGNORECASE)
+
+# всё, с чего может начинаться дата; остальное отсекаем без регулярки
+_FIRST_CHARS = frozenset("0123456789чв") | frozenset(
+    w[0] for w in (*RELATIVE_DAYS, *RU_WEEKDAYS)
+)
+_MAX_LEN = 32
+
+# /ical: тире с пробелами, потом тире без них (01.11-30.11), и только потом пробел —
+# пробелом делится и сама дата («4 ноября 2025»)
+ICAL_RANGE_SEPARATORS = (
+    re.compile(r"\s+[-–—]\s+"),
+    re.compile(r"\s*[-–—]\s*"),
+    re.compile(r"\s+(?=\d)"),
+)
+# календарь — только на годы рядом с текущим: 0000 и 9999 не даты, а переполнение
+ICAL_YEARS_AROUND = 5
+
+
+def today_msk() -> datetime.date:
+    return datetime.datetime.now(MSK).date()
+
+
+def _make_date(year: int, month: int, day: int) -> datetime.date | None:
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_date(text: str | None, today: datetime.date | None = None) -> datetime.date | None:
+    """
+    Разбирает дату из пользовательского текста:
+      4 ноября / 4 ноябрь / 4 ноября 2025 / 21.01 / 21.01.2025,
+      сегодня / завтра / послезавтра / через 3 дня / пятница / в среду.
+    Без года — текущий год по Москве. Для не-дат возвращает None как можно раньше.
+    """
+    if not text or len(text) > _MAX_LEN:
+        return None
+    s = text.strip().lower()
+    if not s or s[0] not in _FIRST_CHARS:
+        return None
+    m = INPUT_DATE_RE.fullmatch(s)
+    if not m:
+        return None
+
+    if m.group("word"):
+        word = m.group("word")
+        if word in RELATIVE_DAYS:
+            today = today or today_msk()
+            return today + datetime.timedelta(days=RELATIVE_DAYS[word])
+        wd = RU_WEEKDAYS.get(word)
+        if wd is None:
+            return None
+        today = today or today_msk()
+        # ближайший такой день недели, не раньше завтрашнего
+        ahead = (wd - today.weekday() - 1) % 7 + 1
+        return today + datetime.timedelta(days=ahead)
+
+    if m.group("shift"):
+        today = today or today_msk()
+        return today + datetime.timedelta(days=int(m.group("shift")))
+
+    if m.group("num_d"):
+        day, month, year = m.group("num_d"), int(m.group("num_m")), m.group("num_y")
+    else:
+        month = RU_MONTHS.get(m.group("txt_m"))
+        if not month:
+            return None
+        day, year = m.group("txt_d"), m.group("txt_y")
+    if not year:
+        year = (today or today_msk()).year
+    return _make_date(int(year), month, int(day))
+
+
+def title_date(title: str | None) -> datetime.date | None:
+    """Дата из заголовка записи RSS («… 4 ноября 2025»)."""
+    m = TITLE_DATE_RE.search(title or "")
+    if not m:
+        return None
+    month = RU_MONTHS.get(m.group(2).lower())
+    if not month:
+        return None
+    return _make_date(int(m.group(3)), month, int(m.group(1)))
+
+
+def format_day(d: datetime.date) -> str:
+    """4 ноября"""
+    return f"{d.day} {RU_MONTHS_GEN[d.month - 1]}"
+
+
+def parse_ical_range(
+    args: str, today: datetime.date | None = None,
+) -> tuple[datetime.date, datetime.date] | None:
+    """'' -> текущий год; '2026' -> год; '4 ноября' -> день; '01.11 - 30.11' -> диапазон."""
+    today = today or today_msk()
+    first, last = today.year - ICAL_YEARS_AROUND, today.year + ICAL_YEARS_AROUND
+    args = args.strip()
+    if not args:
+        return datetime.date(today.year, 1, 1), datetime.date(today.year, 12, 31)
+    if args.isdigit() and len(args) == 4:
+        year = int(args)
+        if not first <= year <= last:
+            return None
+        return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    rng = None
+    single = parse_date(args, today)
+    if single:
+        rng = single, single
+    else:
+        for sep in ICAL_RANGE_SEPARATORS:
+            parts = [p for p in sep.split(args) if p]
+            if len(parts) != 2:
+                continue
+            start, end = parse_date(parts[0], today), parse_date(parts[1], today)
+            if start and end and start <= end:
+                rng = start, end
+                break
+    if rng is None or rng[0].year < first or rng[1].year > last:
+        return None
+    return rng
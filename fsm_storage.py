@@ -0,0 +1,131 @@
+# fsm_storage.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+import metrics
+
+
+class _Record:
+    __slots__ = ("state", "data", "expires_at")
+
+    def __init__(self):
+        self.state: str | None = None
+        self.data: Dict[str, Any] = {}
+        self.expires_at = 0.0
+
+
+class TTLMemoryStorage(BaseStorage):
+    """
+    FSM-хранилище в памяти с ограничениями: запись живёт ttl секунд с последнего обращения,
+    записей не больше max_size (лишние вытесняются по LRU).
+
+    В отличие от MemoryStorage, чтение не создаёт записей, а пустая запись (state=None, data={})
+    сразу удаляется. OrderedDict держит записи в порядке последнего обращения — при общем ttl
+    это и порядок истечения, поэтому фоновая чистка снимает просроченные только с начала,
+    не просматривая остальные.
+    """
+
+    def __init__(self, ttl: float = 30 * 60, max_size: int = 50_000, sweep_interval: float = 60.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        self._records: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self._sweeper: asyncio.Task | None = None
+
+    # ---------- служебное ----------
+
+    def _get(self, key: StorageKey) -> _Record | None:
+        rec = self._records.get(key)
+        if rec is None:
+            return None
+        now = time.monotonic()
+        if rec.expires_at <= now:
+            del self._records[key]
+            metrics.incr("fsm_expired")
+            return None
+        rec.expires_at = now + self.ttl
+        self._records.move_to_end(key)
+        return rec
+
+    def _get_or_create(self, key: StorageKey) -> _Record:
+        rec = self._get(key)
+        if rec is None:
+            rec = self._records[key] = _Record()
+            rec.expires_at = time.monotonic() + self.ttl
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+                metrics.incr("fsm_evicted")
+        return rec
+
+    def _drop_if_empty(self, key: StorageKey, rec: _Record) -> None:
+        if rec.state is None and not rec.data:
+            self._records.pop(key, None)
+
+    def expire(self) -> int:
+        """Снимает просроченные записи с начала очереди; возвращает, сколько снято."""
+        now = time.monotonic()
+        removed = 0
+        records = self._records
+        while records:
+            key, rec = next(iter(records.items()))
+            if rec.expires_at > now:
+                break
+            records.popitem(last=False)
+            removed += 1
+        if removed:
+            metrics.incr("fsm_expired", removed)
+        return removed
+
+    def live_count(self) -> int:
+        return len(self._records)
+
+    def start(self) -> None:
+        """Запускает фоновую чистку (нужен работающий event loop)."""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.expire()
+
+    # ---------- BaseStorage ----------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None:
+            rec = self._get(key)
+            if rec is None:
+                return
+            rec.state = None
+            self._drop_if_empty(key, rec)
+            return
+        self._get_or_create(key).state = state
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        rec = self._get(key)
+        return rec.state if rec else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not data:
+            rec = self._get(key)
+            if rec is None:
+                return
+            rec.data = {}
+            self._drop_if_empty(key, rec)
+            return
+        self._get_or_create(key).data = dict(data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        rec = self._get(key)
+        return dict(rec.data) if rec else {}
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
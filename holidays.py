@@ -1,11 +1,17 @@
 # holidays.py
 import datetime
+import hashlib
 import re
-from zoneinfo import ZoneInfo
+import threading
+import time
 import requests
 import feedparser
 from html import unescape
-from typing import List, Dict, Tuple
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple
+
+import metrics
+from classify import classify
+from dates import title_date as _title_date, today_msk
 
 HEADERS = {
     "User-Agent": (
@@ -14,13 +20,6 @@ HEADERS = {
     )
 }
 
-RU_MONTHS = {
-    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
-    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
-}
-
-DATE_RE = re.compile(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})", re.IGNORECASE)
-
 A_HOLIDAY_RE = re.compile(
     r'<a\s+href="(https?://(?:www\.)?calend\.ru/holidays/[^"]+)"[^>]*>([^<]+)</a>',
     re.IGNORECASE,
@@ -31,63 +30,124 @@ META_DESC_RE = re.compile(
 )
 
 
-def _title_date(title: str) -> datetime.date | None:
-    m = DATE_RE.search(title or "")
-    if not m:
-        return None
-    day = int(m.group(1))
-    month = RU_MONTHS.get(m.group(2).lower())
-    year = int(m.group(3))
-    if not month:
-        return None
-    return datetime.date(year, month, day)
-
-
 def _fetch(url: str) -> str:
     resp = requests.get(url, headers=HEADERS, timeout=20)
     resp.raise_for_status()
     return resp.text
 
 
-def get_holidays_today() -> List[str]:
-    url = "https://www.calend.ru/calendar/feed/"
-    resp = requests.get(url, headers=HEADERS, timeout=15)
+# -------------------- кэши (переживают рестарт через snapshot.py) --------------------
+
+FEED_URL = "https://www.calend.ru/calendar/feed/"
+FEED_TTL = 60 * 60  # сек; лента обновляется раз в сутки
+
+# дата -> {"link": страница дня, "titles": [заголовки из RSS]}
+_FEED_INDEX: Dict[datetime.date, Dict] = {}
+_FEED_FETCHED_AT = 0.0
+_FEED_LOCK = threading.Lock()
+# url праздника -> краткое описание
+_DESC_CACHE: Dict[str, str] = {}
+# дата -> {"limit": max_items, "items": [{title, url, desc}]}
+_DETAILS_CACHE: Dict[datetime.date, Dict] = {}
+# дата -> {"limit", "items": [{title, url}]} со страницы дня, пока описания не подтянуты
+_DAY_ITEMS: Dict[datetime.date, Dict] = {}
+# дата -> когда сайт ответил, что праздников нет (страницы дня нет); держим EMPTY_DAY_TTL сек
+EMPTY_DAY_TTL = 6 * 60 * 60
+_EMPTY_DAYS: Dict[datetime.date, float] = {}
+# вызываются с (date, items) после скачивания нового дня
+_DAY_LISTENERS: List[Callable[[datetime.date, List[Dict]], None]] = []
+
+
+def on_day_scraped(fn: Callable[[datetime.date, List[Dict]], None]) -> None:
+    _DAY_LISTENERS.append(fn)
+
+
+def cached_days() -> List[Tuple[datetime.date, List[Dict]]]:
+    return [(d, entry["items"]) for d, entry in list(_DETAILS_CACHE.items())]
+
+
+def _feed_index() -> Dict[datetime.date, Dict]:
+    """Индекс RSS по датам; лента качается не чаще раза в FEED_TTL."""
+    if _FEED_INDEX and time.time() - _FEED_FETCHED_AT < FEED_TTL:
+        return _FEED_INDEX
+    with _FEED_LOCK:  # из потоков: ленту качает один, остальные ждут его результат
+        if _FEED_INDEX and time.time() - _FEED_FETCHED_AT < FEED_TTL:
+            return _FEED_INDEX
+        return _refresh_feed_index()
+
+
+def _refresh_feed_index() -> Dict[datetime.date, Dict]:
+    global _FEED_FETCHED_AT
+    try:
+        resp = requests.get(FEED_URL, headers=HEADERS, timeout=15)
+        resp.raise_for_status()
+    except Exception:
+        if _FEED_INDEX:
+            return _FEED_INDEX  # лучше устаревший индекс, чем никакого
+        raise
     feed = feedparser.parse(resp.content)
-    entries = list(getattr(feed, "entries", []))
-    today = datetime.datetime.now(ZoneInfo("Europe/Moscow")).date()
-    results = []
-    for e in entries:
+    index: Dict[datetime.date, Dict] = {}
+    for e in getattr(feed, "entries", []):
         title = (getattr(e, "title", "") or "").strip()
         d = _title_date(title)
-        if d == today and title:
-            results.append(title)
-    return results or ["Сегодня нет записей"]
+        if not d:
+            continue
+        row = index.setdefault(d, {"link": getattr(e, "link", None), "titles": []})
+        if title:
+            row["titles"].append(title)
+    _FEED_INDEX.clear()
+    _FEED_INDEX.update(index)
+    _FEED_FETCHED_AT = time.time()
+    return _FEED_INDEX
+
+
+def export_cache() -> Dict:
+    """Копия кэшей в JSON-совместимом виде (для снапшота)."""
+    return {
+        "feed_fetched_at": _FEED_FETCHED_AT,
+        "feed_index": {d.isoformat(): row for d, row in list(_FEED_INDEX.items())},
+        "descriptions": dict(_DESC_CACHE),
+        "details": {d.isoformat(): entry for d, entry in list(_DETAILS_CACHE.items())},
+        "day_urls": {d.isoformat(): url for d, url in list(_DAY_URLS.items())},
+        "day_items": {d.isoformat(): entry for d, entry in list(_DAY_ITEMS.items()) if d >= today_msk()},
+    }
+
+
+def import_cache(data: Dict) -> None:
+    global _FEED_FETCHED_AT
+    _FEED_INDEX.clear()
+    _FEED_INDEX.update(
+        (datetime.date.fromisoformat(k), v) for k, v in data.get("feed_index", {}).items()
+    )
+    _FEED_FETCHED_AT = float(data.get("feed_fetched_at", 0.0)) if _FEED_INDEX else 0.0
+    _DESC_CACHE.update(data.get("descriptions", {}))
+    # дни из старых снапшотов, где описание не скачалось (его нет в descriptions), не берём —
+    # их скачают заново
+    _DETAILS_CACHE.update(
+        (datetime.date.fromisoformat(k), v) for k, v in data.get("details", {}).items()
+        if all(it.get("url") in _DESC_CACHE for it in v.get("items", ()))
+    )
+    _DAY_URLS.update(
+        (datetime.date.fromisoformat(k), v) for k, v in data.get("day_urls", {}).items()
+    )
+    _DAY_ITEMS.update(
+        (datetime.date.fromisoformat(k), v) for k, v in data.get("day_items", {}).items()
+    )
+
+
+def get_holidays_today() -> List[str]:
+    row = _feed_index().get(today_msk())
+    return (row and list(row["titles"])) or ["Сегодня нет записей"]
 
 
 def get_holidays_for_date(target: datetime.date) -> List[str]:
-    url = "https://www.calend.ru/calendar/feed/"
-    resp = requests.get(url, headers=HEADERS, timeout=15)
-    feed = feedparser.parse(resp.content)
-    entries = list(getattr(feed, "entries", []))
-    results = []
-    for e in entries:
-        title = (getattr(e, "title", "") or "").strip()
-        d = _title_date(title)
-        if d == target and title:
-            results.append(title)
-    return results
+    row = _feed_index().get(target)
+    return list(row["titles"]) if row else []
 
 
 def _extract_date_page_url_for(target: datetime.date) -> str | None:
-    url = "https://www.calend.ru/calendar/feed/"
-    resp = requests.get(url, headers=HEADERS, timeout=15)
-    feed = feedparser.parse(resp.content)
-    for e in getattr(feed, "entries", []):
-        title = (getattr(e, "title", "") or "").strip()
-        d = _title_date(title)
-        if d == target:
-            return getattr(e, "link", None)
-    return None
+    row = _feed_index().get(target)
+    return row["link"] if row else None
 
 
 def _shorten(txt: str, limit: int = 200) -> str:
@@ -97,20 +157,122 @@ def _shorten(txt: str, limit: int = 200) -> str:
     return txt[: limit - 1].rstrip() + "…"
 
 
-def get_holiday_details_grouped(
-    target: datetime.date,
-    max_items: int = 20,
-) -> Tuple[List[Dict], List[Dict]]:
+def _fetch_desc(url: str) -> str | None:
+    """Описание праздника; None — страницу скачать не удалось (не кэшируем, в следующий раз попробуем снова)."""
+    if url in _DESC_CACHE:
+        return _DESC_CACHE[url]
+    try:
+        page = _fetch(url)
+    except Exception:
+        return None
+    mm = META_DESC_RE.search(page)
+    desc = _shorten(mm.group(1)) if mm else ""
+    _DESC_CACHE[url] = desc
+    return desc
+
+
+# -------------------- страница дня: прямой адрес, лента — запасной путь --------------------
+
+# схема адресов calend.ru; первой пробуется та, что сработала последней
+DAY_URL_TEMPLATES = [
+    "https://www.calend.ru/day/{d.year}-{d.month}-{d.day}/",
+    "https://www.calend.ru/holidays/{d.month}-{d.day}/",
+]
+
+# дата -> адрес страницы дня, который уже проверен (попадает в снапшот)
+_DAY_URLS: Dict[datetime.date, str] = {}
+
+
+def _try_day_page(url: str) -> str | None:
     """
-    Возвращает кортеж списков:
-      (rus_list, other_list), где каждый элемент: {title, url, desc}
-    Для «других» desc тоже подтягиваем, но бот его не показывает.
+    Страница годится, если открылась и на ней есть ссылки на праздники.
+    "" — сайт ответил, но праздников там нет; None — сайт недоступен (сеть, 5xx).
     """
-    day_url = _extract_date_page_url_for(target)
-    if not day_url:
-        return [], []
+    try:
+        html = _fetch(url)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else 500
+        return "" if status < 500 else None
+    except Exception:
+        return None
+    return html if A_HOLIDAY_RE.search(html) else ""
+
+
+def _resolve_day_page(target: datetime.date) -> str | None:
+    """
+    HTML страницы дня за один запрос: адрес строится из даты по схеме сайта,
+    найденное соответствие запоминается. RSS — только если прямой адрес не открылся.
+    "" — сайт ответил, что страницы дня нет; None — не достучались, ответа нет.
+    """
+    answered = False  # хоть один адрес сайт отверг сам, а не по сбою сети
+    known = _DAY_URLS.get(target)
+    if known:
+        html = _try_day_page(known)
+        if html:
+            return html
+        _DAY_URLS.pop(target, None)
+        answered = html == ""
+
+    for i, template in enumerate(list(DAY_URL_TEMPLATES)):
+        url = template.format(d=target)
+        html = _try_day_page(url)
+        if html:
+            _DAY_URLS[target] = url
+            if i:  # сработавшую схему — вперёд, следующие даты начнут с неё
+                DAY_URL_TEMPLATES.insert(0, DAY_URL_TEMPLATES.pop(i))
+            return html
+        answered = answered or html == ""
+
+    metrics.incr("day_page_feed_fallback")
+    try:
+        url = _extract_date_page_url_for(target)
+    except Exception:
+        return "" if answered else None
+    if not url:
+        return "" if answered else None  # в ленте даты нет; пустой — только если и сайт так ответил
+    html = _try_day_page(url)
+    if html:
+        _DAY_URLS[target] = url
+        return html
+    return "" if answered or html == "" else None
 
-    html = _fetch(day_url)
+
+def _known_empty(target: datetime.date) -> bool:
+    """Сайт недавно ответил, что праздников на дату нет — не спрашиваем снова до EMPTY_DAY_TTL."""
+    at = _EMPTY_DAYS.get(target)
+    if at is None:
+        return False
+    if time.time() - at < EMPTY_DAY_TTL:
+        return True
+    _EMPTY_DAYS.pop(target, None)
+    return False
+
+
+def has_day_items(target: datetime.date) -> bool:
+    """Названия дня уже есть в памяти — get_day_items ответит без сети."""
+    return target in _DETAILS_CACHE or target in _DAY_ITEMS or _known_empty(target)
+
+
+def get_day_items(target: datetime.date, max_items: int = 20) -> List[Dict]:
+    """
+    Первый этап: только названия и ссылки со страницы дня, без описаний.
+    Одна загрузка страницы (или ноль, если день уже в кэше); работает для любой даты, не только из RSS.
+    """
+    cached = _DETAILS_CACHE.get(target)
+    if cached and cached["limit"] >= max_items:
+        return [{"title": it["title"], "url": it["url"]} for it in cached["items"][:max_items]]
+    base = _DAY_ITEMS.get(target)
+    if base and base["limit"] >= max_items:
+        return base["items"][:max_items]
+    if _known_empty(target):
+        return []
+
+    html = _resolve_day_page(target)
+    if html == "":
+        _EMPTY_DAYS[target] = time.time()
+        metrics.incr("day_page_empty")
+    if not html:
+        return []
 
     # уникальные ссылки на праздники
     seen = set()
@@ -124,27 +286,207 @@ def get_holiday_details_grouped(
         base_items.append({"title": title, "url": url})
         if len(base_items) >= max_items:
             break
+    if base_items:
+        _DAY_ITEMS[target] = {"limit": max_items, "items": base_items}
+    return base_items
 
-    rus, other = [], []
+
+def enrich_items(target: datetime.date, base_items: List[Dict], max_items: int = 20) -> List[Dict]:
+    """
+    Второй этап: описания (по странице на праздник) и теги. В кэш (и снапшот) день попадает,
+    только если скачались все описания: от описания зависят теги и деление Россия/остальные.
+    Праздники без описания помечены "partial": True — следующий запрос докачает только их.
+    """
+    items = []
+    missing = 0
     for it in base_items:
+        desc = _fetch_desc(it["url"])
+        item = {
+            "title": it["title"], "url": it["url"], "desc": desc or "",
+            "tags": classify(it["title"], desc or ""),
+        }
+        if desc is None:
+            item["partial"] = True
+            missing += 1
+        items.append(item)
+    if missing:
+        metrics.incr("desc_fetch_failed", missing)
+    elif items:
+        _DETAILS_CACHE[target] = {"limit": max_items, "items": items}
+        _DAY_ITEMS.pop(target, None)
+        for fn in _DAY_LISTENERS:
+            fn(target, items)
+    return items
+
+
+def partial_details(base_items: List[Dict]) -> List[Dict]:
+    """Что есть на данный момент: описания только уже скачанные, теги — по доступному тексту."""
+    items = []
+    for it in base_items:
+        desc = _DESC_CACHE.get(it["url"])
+        item = {
+            "title": it["title"], "url": it["url"], "desc": desc or "",
+            "tags": classify(it["title"], desc or ""),
+        }
+        if desc is None:
+            item["partial"] = True
+        items.append(item)
+    return items
+
+
+def get_day_details(target: datetime.date, max_items: int = 20) -> List[Dict]:
+    """Праздники дня с описаниями и тегами: из кэша или оба этапа подряд."""
+    cached = _DETAILS_CACHE.get(target)
+    if cached and cached["limit"] >= max_items:
+        return cached["items"][:max_items]
+    return enrich_items(target, get_day_items(target, max_items), max_items)
+
+
+def peek_day_details(target: datetime.date, max_items: int = 20) -> List[Dict] | None:
+    """То же только из кэша: None, если дата ещё не скачивалась. Сеть не трогает."""
+    cached = _DETAILS_CACHE.get(target)
+    if not cached:
+        return [] if _known_empty(target) else None
+    return cached["items"][:max_items]
+
+
+def _tags(it: Dict) -> List[str]:
+    """Теги праздника; для записей из старого снапшота считаются один раз и запоминаются."""
+    tags = it.get("tags")
+    if tags is None:
+        tags = it["tags"] = classify(it["title"], it.get("desc", ""))
+    return tags
+
+
+def group_by_tags(items: List[Dict], order: List[str]) -> Dict[str, List[Dict]]:
+    """
+    Раскладывает праздники по первой подходящей группе из order; остальное — в "other".
+    Работает только по сохранённым тегам, текст заново не сканируется.
+    """
+    groups: Dict[str, List[Dict]] = {tag: [] for tag in order}
+    groups["other"] = []
+    for it in items:
+        tags = _tags(it)
+        key = next((tag for tag in order if tag in tags), "other")
+        groups[key].append(it)
+    return groups
+
+
+def group_rus_other(items: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    groups = group_by_tags(items, ["russia"])
+    return groups["russia"], groups["other"]
+
+
+def get_holiday_details_grouped(
+    target: datetime.date,
+    max_items: int = 20,
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Возвращает кортеж списков:
+      (rus_list, other_list), где каждый элемент: {title, url, desc, tags}
+    Для «других» desc тоже подтягиваем, но бот его не показывает.
+    """
+    return group_rus_other(get_day_details(target, max_items))
+
+
+def peek_holiday_details_grouped(
+    target: datetime.date,
+    max_items: int = 20,
+) -> Tuple[List[Dict], List[Dict]] | None:
+    """То же, но только из кэша: None, если дата ещё не скачивалась. Сеть не трогает."""
+    items = peek_day_details(target, max_items)
+    return None if items is None else group_rus_other(items)
+
+
+# -------------------- экспорт в iCalendar --------------------
+
+def _ics_escape(text: str) -> str:
+    return (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_line(line: str) -> str:
+    """Строка .ics с переносом по 75 октетов (RFC 5545, 3.1); не режет UTF-8 посреди символа."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, cur, size = [], [], 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > (75 if not parts else 74):  # у продолжения первый октет — пробел
+            parts.append("".join(cur))
+            cur, size = [], 0
+        cur.append(ch)
+        size += n
+    parts.append("".join(cur))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_event(uid: str, day: datetime.date, summary: str, stamp: str,
+               desc: str = "", url: str = "", rrule: str = "") -> Iterator[str]:
+    yield _ics_line("BEGIN:VEVENT")
+    yield _ics_line(f"UID:{uid}")
+    yield _ics_line(f"DTSTAMP:{stamp}")
+    yield _ics_line(f"DTSTART;VALUE=DATE:{day:%Y%m%d}")
+    if day < datetime.date.max:  # без DTEND событие и так длится один день (RFC 5545, 3.6.1)
+        yield _ics_line(f"DTEND;VALUE=DATE:{day + datetime.timedelta(days=1):%Y%m%d}")
+    if rrule:
+        yield _ics_line(f"RRULE:{rrule}")
+    yield _ics_line(f"SUMMARY:{_ics_escape(summary)}")
+    if desc:
+        yield _ics_line(f"DESCRIPTION:{_ics_escape(desc)}")
+    if url:
+        yield _ics_line(f"URL:{url}")
+    yield _ics_line("TRANSP:TRANSPARENT")
+    yield _ics_line("END:VEVENT")
+
+
+def iter_ical(
+    start: datetime.date,
+    end: datetime.date,
+    custom: Iterable[Dict] = (),
+    local: Iterable[Dict] = (),
+) -> Iterator[str]:
+    """
+    Календарь .ics за [start, end] построчно, без сборки документа в памяти.
+    Праздники calend.ru берутся только из кэшей — сайт не трогаем: с описаниями (_DETAILS_CACHE),
+    а для дней из обхода, где описаний ещё нет, — одни названия (_DAY_ITEMS).
+    custom — записи custom_holidays.json, local — записи локальных наборов в том же виде
+    ({date, title, repeat[, desc, url]}); ежегодные идут одним событием с RRULE.
+    """
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield _ics_line("BEGIN:VCALENDAR")
+    yield _ics_line("VERSION:2.0")
+    yield _ics_line("PRODID:-//holidays_bot//calend.ru//RU")
+    yield _ics_line("CALSCALE:GREGORIAN")
+    yield _ics_line("X-WR-CALNAME:Праздники")
+
+    for i in range((end - start).days + 1):  # без day += 1: после 9999-12-31 дат нет
+        day = start + datetime.timedelta(days=i)
+        cached = _DETAILS_CACHE.get(day) or _DAY_ITEMS.get(day)
+        for it in (cached["items"] if cached else ()):
+            uid = f"{day:%Y%m%d}-{hashlib.sha1(it['url'].encode()).hexdigest()[:16]}@holidays_bot"
+            yield from _ics_event(uid, day, it["title"], stamp, it.get("desc", ""), it["url"])
+
+    yield from _ics_records(custom, "custom", start, end, stamp)
+    yield from _ics_records(local, "local", start, end, stamp)
+
+    yield _ics_line("END:VCALENDAR")
+
+
+def _ics_records(records: Iterable[Dict], prefix: str, start: datetime.date, end: datetime.date,
+                 stamp: str) -> Iterator[str]:
+    for rec in records:
         try:
-            page = _fetch(it["url"])
-            mm = META_DESC_RE.search(page)
-            desc = _shorten(mm.group(1)) if mm else ""
-        except Exception:
-            desc = ""
-
-        title_l = it["title"].lower()
-        desc_l = desc.lower()
-        is_russia = ("росси" in title_l) or ("росси" in desc_l)  # Россия/России/российский…
-
-        enriched = {"title": it["title"], "url": it["url"], "desc": desc}
-        if is_russia:
-            rus.append(enriched)
-        else:
-            other.append(enriched)
-
-    return rus, other
+            d = datetime.date.fromisoformat(rec["date"])
+        except (KeyError, ValueError):
+            continue
+        annual = rec.get("repeat") == "annual"
+        if d > end or (not annual and d < start):
+            continue
+        key = f"{rec['date']}|{rec.get('title', '')}"
+        uid = f"{prefix}-{hashlib.sha1(key.encode()).hexdigest()[:16]}@holidays_bot"
+        yield from _ics_event(uid, d, rec.get("title", ""), stamp, rec.get("desc", ""), rec.get("url", ""),
+                              rrule="FREQ=YEARLY" if annual else "")
 
 
 def get_holiday_details_for_date(target: datetime.date, max_items: int = 10) -> List[Dict]:
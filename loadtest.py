@@ -0,0 +1,277 @@
+# loadtest.py
+"""
+Нагрузочный прогон хендлеров без сети:
+    python loadtest.py --updates 2000 --concurrency 50 --mix today=4,date=3,wizard=1,chatter=10
+
+Синтетические апдейты идут прямо в dp.feed_update. Bot API подменён фейковой сессией,
+calend.ru — фейковыми страницами с задержкой --scrape-ms. Все файлы бота (subs.json,
+custom_holidays.json, …) пишутся во временный каталог, рабочие данные не трогаются.
+Отчёт: апдейтов/с, p50/p95/p99 времени обработки по видам и задержка event loop.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, InputFile, Message, Update, User
+
+SCENARIOS = ("today", "date", "wizard", "chatter")
+CHATTER = [
+    "привет всем", "ок", "кто идёт обедать?", "😂😂", "скинь ссылку",
+    "Когда день программиста?", "12345", "завтра созвон в 10", "ага",
+]
+DATES = ["4 ноября", "21.01", "завтра", "послезавтра", "через 5 дней", "пятница", "12.06.2026", "8 марта"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+# ---------- фейковый Bot API ----------
+
+class FakeSession(BaseSession):
+    """Отвечает на любой метод Bot API сразу (плюс --api-ms), ничего не отправляя."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        # файлы вычитываем, как это сделала бы настоящая выгрузка
+        for value in vars(method).values():
+            if isinstance(value, InputFile):
+                async for _ in value.read(bot):
+                    pass
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.__returning__ is not Message:
+            return True
+        self._message_id += 1
+        chat_id = getattr(method, "chat_id", 0) or 0
+        return Message(
+            message_id=self._message_id,
+            date=datetime.now(),
+            chat=Chat(id=int(chat_id), type="private"),
+            text=getattr(method, "text", None),
+        )
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+# ---------- фейковый calend.ru ----------
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeCalendRu:
+    """Подменяет requests.get в holidays.py: лента на год, страницы дней и праздников."""
+
+    MONTHS = ("января", "февраля", "марта", "апреля", "мая", "июня",
+              "июля", "августа", "сентября", "октября", "ноября", "декабря")
+
+    def __init__(self, latency: float, per_day: int):
+        self.latency = latency
+        self.per_day = per_day
+        self.requests: Counter = Counter()
+
+    def _feed(self) -> str:
+        start = datetime.now().date() - timedelta(days=400)
+        items = []
+        for i in range(800):
+            d = start + timedelta(days=i)
+            items.append(
+                f"<item><title>Ежедневник {d.day} {self.MONTHS[d.month - 1]} {d.year}</title>"
+                f"<link>https://www.calend.ru/day/{d.year}-{d.month}-{d.day}/</link></item>"
+            )
+        return f'<?xml version="1.0"?><rss version="2.0"><channel>{"".join(items)}</channel></rss>'
+
+    def get(self, url: str, headers=None, timeout=None, **kwargs) -> FakeResponse:
+        time.sleep(self.latency)  # requests синхронный — блокирует так же, как настоящий
+        if "/calendar/feed" in url:
+            self.requests["feed"] += 1
+            return FakeResponse(self._feed())
+        if "/day/" in url:
+            self.requests["day"] += 1
+            key = url.rstrip("/").rsplit("/", 1)[-1]
+            links = "".join(
+                f'<a href="https://www.calend.ru/holidays/0/0/{key}-{i}/">'
+                f"{'День работника России' if i % 3 == 0 else 'Международный день'} {key} #{i}</a>"
+                for i in range(self.per_day)
+            )
+            return FakeResponse(f"<html><body>{links}</body></html>")
+        self.requests["holiday"] += 1
+        return FakeResponse(
+            f'<html><head><meta name="description" content="Описание праздника {url}"></head></html>'
+        )
+
+
+# ---------- генерация апдейтов ----------
+
+class Generator:
+    def __init__(self, dp, bot, users: int):
+        self.dp = dp
+        self.bot = bot
+        self.users = users
+        self.update_id = 0
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors = 0
+
+    async def send(self, kind: str, user_id: int, text: str) -> None:
+        self.update_id += 1
+        user = User(id=user_id, is_bot=False, first_name=f"u{user_id}")
+        update = Update(
+            update_id=self.update_id,
+            message=Message(
+                message_id=self.update_id,
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                from_user=user,
+                text=text,
+            ),
+        )
+        t0 = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors += 1
+            if self.errors <= 5:
+                print(f"[loadtest] {kind}: {e!r}", file=sys.stderr)
+        self.latencies[kind].append(time.perf_counter() - t0)
+
+    async def scenario(self, kind: str) -> int:
+        """Один сценарий одного пользователя; возвращает число апдейтов."""
+        uid = random.randint(1, self.users)
+        if kind == "today":
+            await self.send(kind, uid, "📆 Сегодня")
+            return 1
+        if kind == "date":
+            await self.send(kind, uid, random.choice(DATES))
+            return 1
+        if kind == "wizard":
+            day = datetime.now().date() + timedelta(days=random.randint(0, 365))
+            for text in ("➕ Добавить праздник", day.isoformat(), f"Нагрузка {uid}-{self.update_id}", "Один раз"):
+                await self.send(kind, uid, text)
+            return 4
+        await self.send(kind, uid, random.choice(CHATTER))
+        return 1
+
+
+async def loop_lag_monitor(samples: list[float], stop: asyncio.Event, interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - t0 - interval))
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"неизвестный сценарий: {name} (есть: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run(args) -> None:
+    os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+    workdir = tempfile.mkdtemp(prefix="holidays_loadtest_")
+    os.chdir(workdir)  # файлы бота — относительные пути
+
+    import holidays
+    calend = FakeCalendRu(args.scrape_ms / 1000, args.per_day)
+    holidays.requests.get = calend.get
+
+    import bot as bot_module
+    import metrics
+    session = FakeSession(args.api_ms / 1000)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+
+    gen = Generator(bot_module.dp, bot, args.users)
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+
+    lag: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(loop_lag_monitor(lag, stop))
+
+    remaining = args.updates
+    sent = 0
+
+    async def worker():
+        nonlocal remaining, sent
+        while remaining > 0:
+            remaining -= 1
+            n = await gen.scenario(random.choices(kinds, weights)[0])
+            sent += n
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await monitor
+
+    print(f"каталог: {workdir}")
+    print(f"апдейтов: {sent} за {elapsed:.2f} с — {sent / elapsed:.0f} апд/с, ошибок: {gen.errors}")
+    print(f"{'вид':10s} {'n':>6s} {'p50, мс':>9s} {'p95, мс':>9s} {'p99, мс':>9s} {'max, мс':>9s}")
+    everything = []
+    for kind, values in sorted(gen.latencies.items()):
+        everything += values
+        print(f"{kind:10s} {len(values):6d} " + " ".join(
+            f"{percentile(values, p) * 1000:9.1f}" for p in (50, 95, 99, 100)
+        ))
+    print(f"{'всего':10s} {len(everything):6d} " + " ".join(
+        f"{percentile(everything, p) * 1000:9.1f}" for p in (50, 95, 99, 100)
+    ))
+    print("лаг event loop, мс: " + " ".join(
+        f"p{p}={percentile(lag, p) * 1000:.1f}" for p in (50, 95, 99)
+    ) + f" max={max(lag, default=0) * 1000:.1f}")
+    print(f"Bot API: {dict(session.calls)}")
+    print(f"calend.ru: {dict(calend.requests)}")
+    print("метрики бота:\n" + metrics.report())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--updates", type=int, default=1000, help="сколько сценариев прогнать")
+    ap.add_argument("--concurrency", type=int, default=20, help="одновременных пользователей")
+    ap.add_argument("--users", type=int, default=500, help="разных chat_id")
+    ap.add_argument("--mix", default="today=4,date=3,wizard=1,chatter=10", help="веса сценариев")
+    ap.add_argument("--api-ms", type=float, default=5.0, help="задержка ответа Bot API")
+    ap.add_argument("--scrape-ms", type=float, default=20.0, help="задержка каждого запроса к calend.ru")
+    ap.add_argument("--per-day", type=int, default=12, help="праздников на странице дня")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# metrics.py
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+STARTED_AT = time.perf_counter()
+
+_COUNTERS: Dict[str, int] = {}
+# имя -> {"count", "total", "max", "first", "last"} (секунды)
+_TIMINGS: Dict[str, Dict[str, float]] = {}
+# имя -> функция, возвращающая текущее значение
+_GAUGES: Dict[str, Callable[[], float]] = {}
+
+
+def incr(name: str, n: int = 1) -> None:
+    _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def observe(name: str, seconds: float) -> None:
+    t = _TIMINGS.get(name)
+    if t is None:
+        _TIMINGS[name] = {"count": 1, "total": seconds, "max": seconds, "first": seconds, "last": seconds}
+        return
+    t["count"] += 1
+    t["total"] += seconds
+    t["max"] = max(t["max"], seconds)
+    t["last"] = seconds
+
+
+@contextmanager
+def timed(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+
+def gauge(name: str, fn: Callable[[], float]) -> None:
+    _GAUGES[name] = fn
+
+
+def mark_started(ts: float) -> None:
+    """Точка отсчёта uptime, если процесс стартовал раньше импорта этого модуля (см. bot.py)."""
+    global STARTED_AT
+    STARTED_AT = ts
+
+
+def uptime() -> float:
+    return time.perf_counter() - STARTED_AT
+
+
+def report() -> str:
+    lines = [f"uptime: {uptime():.0f} с"]
+    for name, fn in sorted(_GAUGES.items()):
+        try:
+            lines.append(f"{name}: {fn()}")
+        except Exception as e:
+            lines.append(f"{name}: ошибка {e}")
+    for name, n in sorted(_COUNTERS.items()):
+        lines.append(f"{name}: {n}")
+    for name, t in sorted(_TIMINGS.items()):
+        avg = t["total"] / t["count"]
+        lines.append(
+            f"{name}: n={t['count']:.0f} первый={t['first'] * 1000:.0f}мс "
+            f"ср={avg * 1000:.0f}мс макс={t['max'] * 1000:.0f}мс"
+        )
+    return "\n".join(lines)
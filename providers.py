@@ -0,0 +1,370 @@
+# providers.py
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import custom_holidays
+import holidays
+import metrics
+from classify import classify, normalize
+
+# Встроенный набор: государственные и самые известные праздники, работает без сети
+STATIC_FILE = Path(__file__).with_name("static_holidays.json")
+
+# У локальных источников и у сайта разные пулы потоков: зависшие загрузки calend.ru
+# не займут потоки, в которых читаются файлы. Сайт — не больше CALEND_WORKERS загрузок сразу.
+CALEND_WORKERS = 4
+LOCAL_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="provider-local")
+CALEND_POOL = ThreadPoolExecutor(max_workers=CALEND_WORKERS, thread_name_prefix="provider-calend")
+
+
+class HolidayProvider(ABC):
+    """
+    Источник праздников на дату. fetch синхронный (запускается в потоке) и возвращает
+    [{title, url, desc, tags?}]; url и desc могут быть пустыми.
+    peek — то же без похода в сеть; None — «без сети не знаю».
+    """
+
+    name = "base"
+    timeout = 2.0    # сек с начала загрузки; дольше ответ не ждёт
+    online = False   # нужна ли сеть
+    executor: Executor = LOCAL_POOL
+
+    @abstractmethod
+    def fetch(self, target: date) -> List[Dict]:
+        ...
+
+    def peek(self, target: date) -> List[Dict] | None:
+        return self.fetch(target)
+
+    def version(self) -> int:
+        """Меняется вместе с данными источника — для ключей кэшей готовых текстов."""
+        return 0
+
+    def entries(self) -> Iterable[Tuple[str, Dict]]:
+        """Все записи источника как ("ММ-ДД" или "ГГГГ-ММ-ДД", запись) — для поиска по названию."""
+        return ()
+
+
+class CalendRuProvider(HolidayProvider):
+    name = "calend.ru"
+    online = True
+    executor = CALEND_POOL
+
+    def __init__(self, timeout: float = 30.0, max_items: int = 20):
+        self.timeout = timeout
+        self.max_items = max_items
+
+    def fetch(self, target: date) -> List[Dict]:
+        return holidays.get_day_details(target, self.max_items)
+
+    def peek(self, target: date) -> List[Dict] | None:
+        return holidays.peek_day_details(target, self.max_items)
+
+
+class CustomProvider(HolidayProvider):
+    """Свои праздники из custom_holidays.json."""
+
+    name = "custom"
+
+    def fetch(self, target: date) -> List[Dict]:
+        return [{"title": t, "url": "", "desc": ""} for t in custom_holidays.get_for_date(target)]
+
+    def version(self) -> int:
+        return custom_holidays.version()
+
+
+def _parse_days(raw) -> Dict[str, List[Dict]]:
+    """Проверяет содержимое локального JSON; битые строки пропускает, битый файл — ValueError."""
+    if not isinstance(raw, dict):
+        raise ValueError("ожидается объект {дата: [праздники]}")
+    days: Dict[str, List[Dict]] = {}
+    skipped = 0
+    for key, rows in raw.items():
+        if not isinstance(rows, list):
+            skipped += 1
+            continue
+        items = []
+        for r in rows:
+            if isinstance(r, str):
+                r = {"title": r}
+            if not isinstance(r, dict) or not isinstance(r.get("title"), str) or not r["title"].strip():
+                skipped += 1
+                continue
+            items.append({
+                "title": r["title"].strip(),
+                "url": r.get("url") if isinstance(r.get("url"), str) else "",
+                "desc": r.get("desc") if isinstance(r.get("desc"), str) else "",
+            })
+        days[key] = items
+    if skipped:
+        print(f"[providers] пропущено битых записей: {skipped}")
+    return days
+
+
+class JsonFileProvider(HolidayProvider):
+    """
+    Локальный JSON: {"ММ-ДД" (каждый год) или "ГГГГ-ММ-ДД": [{"title", "url", "desc"} или "название", ...]}.
+    Файл перечитывается, только когда меняется его mtime.
+    """
+
+    def __init__(self, path: Path, name: str = "json", timeout: float = 2.0):
+        self.path = Path(path)
+        self.name = name
+        self.timeout = timeout
+        self._mtime = -1
+        self._days: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, List[Dict]]:
+        mtime = self.version()
+        if mtime == self._mtime:
+            return self._days
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    days = _parse_days(json.loads(self.path.read_text(encoding="utf-8"))) if mtime else {}
+                except Exception as e:
+                    print(f"[providers] {self.path} не прочитан: {e}")
+                    days = {}
+                self._days, self._mtime = days, mtime
+        return self._days
+
+    def fetch(self, target: date) -> List[Dict]:
+        days = self._load()
+        return days.get(target.strftime("%m-%d"), []) + days.get(target.isoformat(), [])
+
+    def entries(self) -> Iterable[Tuple[str, Dict]]:
+        return [(key, it) for key, items in self._load().items() for it in items]
+
+    def version(self) -> int:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return 0
+
+
+class SqliteProvider(HolidayProvider):
+    """
+    Локальная база SQLite, только чтение. Таблица:
+        CREATE TABLE holidays (day TEXT, title TEXT, url TEXT, desc TEXT)
+    day — "ММ-ДД" (каждый год) или "ГГГГ-ММ-ДД".
+    """
+
+    def __init__(self, path: Path, name: str = "sqlite", timeout: float = 2.0):
+        self.path = Path(path)
+        self.name = name
+        self.timeout = timeout
+
+    def fetch(self, target: date) -> List[Dict]:
+        if not self.path.exists():
+            return []
+        # соединение на вызов: fetch идёт в разных потоках, а открыть файл дешевле запроса к сайту
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                "SELECT title, url, desc FROM holidays WHERE day IN (?, ?)",
+                (target.strftime("%m-%d"), target.isoformat()),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"title": t, "url": u or "", "desc": d or ""} for t, u, d in rows]
+
+    def entries(self) -> Iterable[Tuple[str, Dict]]:
+        if not self.path.exists():
+            return []
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT day, title, url, desc FROM holidays").fetchall()
+        finally:
+            conn.close()
+        return [(day, {"title": t, "url": u or "", "desc": d or ""}) for day, t, u, d in rows if t]
+
+    def version(self) -> int:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return 0
+
+
+def entry_date(key: str, today: date) -> Tuple[date, str] | None:
+    """Ключ записи -> (ближайшая дата не раньше today, "annual"/"once"); None — ключ не дата."""
+    try:
+        if len(key) == 10:
+            return date.fromisoformat(key), "once"
+        month, day = map(int, key.split("-"))
+    except ValueError:
+        return None
+    for year in range(today.year, today.year + 8):  # 29 февраля — до ближайшего високосного
+        try:
+            d = date(year, month, day)
+        except ValueError:
+            continue
+        if d >= today:
+            return d, "annual"
+    return None
+
+
+def local_file_provider(path: str) -> HolidayProvider:
+    """Провайдер для HOLIDAYS_LOCAL_FILE: .json — JSON, остальное — SQLite."""
+    if path.lower().endswith(".json"):
+        return JsonFileProvider(Path(path), name="local")
+    return SqliteProvider(Path(path), name="local")
+
+
+def build_providers(offline: bool = False, local_file: str = "", calend_timeout: float = 30.0) -> List[HolidayProvider]:
+    """
+    Источники по убыванию приоритета: при совпадении праздника остаётся запись из первого.
+    offline — без calend.ru, только локальные.
+    """
+    providers: List[HolidayProvider] = []
+    if not offline:
+        providers.append(CalendRuProvider(timeout=calend_timeout))
+    if local_file:
+        providers.append(local_file_provider(local_file))
+    providers.append(JsonFileProvider(STATIC_FILE, name="static"))
+    providers.append(CustomProvider())
+    return providers
+
+
+def data_version(providers: Iterable[HolidayProvider]) -> int:
+    """Общая версия локальных данных: хэш от int-ов стабилен между запусками (годится для снапшота)."""
+    return hash(tuple(p.version() for p in providers))
+
+
+def _title_key(title: str) -> str:
+    return normalize(title).strip()
+
+
+def merge(results: Sequence[Tuple[str, List[Dict]]]) -> List[Dict]:
+    """
+    Сливает ответы источников [(имя, записи), ...] в один список: дубль — та же ссылка или
+    то же название (без регистра и знаков). Остаётся первая запись, пустые url/desc берутся из дубля.
+    Каждой записи проставляются source (имя источника, если его ещё нет) и tags.
+    """
+    merged: List[Dict] = []
+    by_url: Dict[str, Dict] = {}
+    by_title: Dict[str, Dict] = {}
+    for name, items in results:
+        for it in items:
+            url = (it.get("url") or "").rstrip("/").lower()
+            title = _title_key(it["title"])
+            prev = (by_url.get(url) if url else None) or by_title.get(title)
+            if prev is not None:
+                if not prev["url"] and it.get("url"):
+                    prev["url"] = it["url"]
+                    by_url[url] = prev
+                if not prev["desc"] and it.get("desc"):
+                    prev["desc"] = it["desc"]
+                    prev["tags"] = classify(prev["title"], prev["desc"])
+                continue
+            desc = it.get("desc", "")
+            rec = {
+                "title": it["title"], "url": it.get("url", ""), "desc": desc,
+                "tags": it["tags"] if "tags" in it else classify(it["title"], desc),
+                "source": it.get("source") or name,
+            }
+            merged.append(rec)
+            if url:
+                by_url[url] = rec
+            by_title[title] = rec
+    return merged
+
+
+# (источник, дата) -> (момент начала загрузки, результат); одна загрузка на дату,
+# сколько бы запросов её ни ждали. Живёт в потоке event loop.
+_INFLIGHT: Dict[Tuple[str, date], Tuple[asyncio.Future, asyncio.Future]] = {}
+
+
+def _start(provider: HolidayProvider, target: date) -> Tuple[asyncio.Future, asyncio.Future]:
+    key = (provider.name, target)
+    hit = _INFLIGHT.get(key)
+    if hit is not None:
+        return hit
+    loop = asyncio.get_running_loop()
+    started = loop.create_future()
+
+    def mark(ts: float) -> None:
+        if not started.done():
+            started.set_result(ts)
+
+    def run() -> List[Dict]:
+        loop.call_soon_threadsafe(mark, time.monotonic())
+        return provider.fetch(target)
+
+    result = loop.run_in_executor(provider.executor, run)
+
+    def done(fut: asyncio.Future) -> None:
+        _INFLIGHT.pop(key, None)
+        mark(time.monotonic())
+        if not fut.cancelled():
+            fut.exception()  # ошибку разберёт тот, кто ждёт; здесь — чтобы не было «never retrieved»
+
+    result.add_done_callback(done)
+    _INFLIGHT[key] = (started, result)
+    return started, result
+
+
+async def _ask(provider: HolidayProvider, target: date) -> List[Dict]:
+    """
+    Ответ источника. timeout отсчитывается с начала загрузки, а не с постановки в очередь;
+    сколько ждать места в пуле — тоже не больше timeout.
+    """
+    t0 = time.perf_counter()
+    started, result = _start(provider, target)
+    try:
+        began = await asyncio.wait_for(asyncio.shield(started), provider.timeout)
+        left = provider.timeout - (time.monotonic() - began)
+        if left <= 0 and not result.done():
+            raise asyncio.TimeoutError
+        return await asyncio.wait_for(asyncio.shield(result), max(left, 0))
+    finally:
+        metrics.observe(f"provider_{provider.name}", time.perf_counter() - t0)
+
+
+async def query(target: date, providers: Sequence[HolidayProvider]) -> Tuple[List[Dict], bool]:
+    """
+    Опрашивает все источники параллельно, каждый — не дольше своего timeout.
+    Возвращает (слитый список, ответили ли все). Опоздавший источник в своём пуле доработает
+    сам и заполнит свой кэш — следующий запрос его уже застанет.
+    """
+    answers = await asyncio.gather(*(_ask(p, target) for p in providers), return_exceptions=True)
+    results = []
+    complete = True
+    for provider, answer in zip(providers, answers):
+        if isinstance(answer, BaseException):
+            complete = False
+            if isinstance(answer, asyncio.TimeoutError):
+                metrics.incr(f"provider_{provider.name}_timeouts")
+            else:
+                metrics.incr(f"provider_{provider.name}_errors")
+                print(f"[providers] {provider.name} {target}: {answer!r}")
+            continue
+        if any(it.get("partial") for it in answer):  # источник ответил не всем — кэшировать рано
+            complete = False
+        results.append((provider.name, answer))
+    return merge(results), complete
+
+
+def peek(target: date, providers: Sequence[HolidayProvider]) -> List[Dict] | None:
+    """Слитый список без сети; None — если хоть один источник без сети ответить не может."""
+    results = []
+    for provider in providers:
+        try:
+            items = provider.peek(target)
+        except Exception as e:  # битый локальный источник не должен ронять inline-режим
+            metrics.incr(f"provider_{provider.name}_errors")
+            print(f"[providers] {provider.name} {target}: {e!r}")
+            items = []
+        if items is None:
+            return None
+        results.append((provider.name, items))
+    return merge(results)
+
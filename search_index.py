@@ -0,0 +1,179 @@
+# search_index.py
+import datetime
+import math
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Set
+
+TOKEN_RE = re.compile(r"[а-яa-z0-9]+")
+STOP_WORDS = frozenset({"когда", "какой", "какого", "какая", "числа", "в", "во", "на", "и", "по", "а"})
+
+MIN_PREFIX = 3        # короче — только точное совпадение слова
+FUZZY_MIN_SIM = 0.45  # доля общих триграмм (Dice), ниже — не считаем похожим
+TITLE_WEIGHT = 3.0    # совпадение в названии важнее, чем в описании
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower().replace("ё", "е")) if t not in STOP_WORDS]
+
+
+def _trigrams(token: str) -> Set[str]:
+    t = f"^{token}$"
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+class HolidayIndex:
+    """
+    Инвертированный индекс по названиям и описаниям праздников.
+    Слово -> документы (отдельно для названия и описания), плюс отсортированный
+    словарь для поиска по префиксу и триграммы слов для нечёткого поиска.
+    Пополняется инкрементально: add_day() после скачивания дня (и фоновым обходом года),
+    add_custom() после add_custom. Один праздник из разных источников — один документ:
+    совпадают ссылка или название.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._docs: List[Dict] = []          # {title, url, desc, custom, repeat, dates: set[date]}
+        self._doc_by_key: Dict[str, int] = {}
+        self._title_postings: Dict[str, Set[int]] = {}
+        self._desc_postings: Dict[str, Set[int]] = {}
+        self._vocab_trigrams: Dict[str, Set[str]] = {}  # триграмма -> слова
+        self._vocab_sorted: List[str] = []
+        self._vocab_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ---------- наполнение ----------
+
+    def _add_doc(self, keys: List[str], title: str, url: str, desc: str, day: datetime.date,
+                 custom: bool = False, repeat: str = "") -> None:
+        doc_id = next((self._doc_by_key[k] for k in keys if k in self._doc_by_key), None)
+        if doc_id is not None:
+            doc = self._docs[doc_id]
+            doc["dates"].add(day)
+            if url and not doc["url"]:
+                doc["url"] = url
+            if desc and not doc["desc"]:  # после обхода были только названия — описание пришло позже
+                doc["desc"] = desc
+                self._post(self._desc_postings, desc, doc_id)
+        else:
+            doc_id = len(self._docs)
+            self._docs.append({
+                "title": title, "url": url, "desc": desc,
+                "custom": custom, "repeat": repeat, "dates": {day},
+            })
+            self._post(self._title_postings, title, doc_id)
+            self._post(self._desc_postings, desc, doc_id)
+        for k in keys:
+            self._doc_by_key.setdefault(k, doc_id)
+
+    def _post(self, postings: Dict[str, Set[int]], text: str, doc_id: int) -> None:
+        for tok in set(tokenize(text)):
+            if tok not in postings:
+                self._add_vocab(tok)
+            postings.setdefault(tok, set()).add(doc_id)
+
+    def _add_vocab(self, tok: str) -> None:
+        if tok in self._title_postings or tok in self._desc_postings:
+            return
+        for tg in _trigrams(tok):
+            self._vocab_trigrams.setdefault(tg, set()).add(tok)
+        self._vocab_dirty = True
+
+    def add_day(self, day: datetime.date, items: Iterable[Dict], repeat: str = "") -> None:
+        """Праздники за день: {title, url?, desc?} — с calend.ru или из локальных источников."""
+        with self._lock:
+            for it in items:
+                url = it.get("url") or ""
+                keys = ([url] if url else []) + ["title:" + " ".join(tokenize(it["title"]))]
+                self._add_doc(keys, it["title"], url, it.get("desc") or "", day, repeat=repeat)
+
+    def add_custom(self, rec: Dict) -> None:
+        """Запись custom_holidays.json: {date, title, repeat}."""
+        try:
+            day = datetime.date.fromisoformat(rec["date"])
+        except (KeyError, ValueError):
+            return
+        title = rec.get("title", "")
+        if not title:
+            return
+        key = f"custom:{rec['date']}:{title.lower()}"
+        with self._lock:
+            self._add_doc([key], title, "", "", day, custom=True, repeat=rec.get("repeat", "once"))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    # ---------- поиск ----------
+
+    def _expand(self, tok: str) -> Dict[str, float]:
+        """Слова словаря, подходящие под слово запроса, с коэффициентом похожести."""
+        if self._vocab_dirty:
+            self._vocab_sorted = sorted(set(self._title_postings) | set(self._desc_postings))
+            self._vocab_dirty = False
+
+        out: Dict[str, float] = {}
+        if tok in self._title_postings or tok in self._desc_postings:
+            out[tok] = 1.0
+        if len(tok) >= MIN_PREFIX:
+            i = bisect_left(self._vocab_sorted, tok)
+            while i < len(self._vocab_sorted) and self._vocab_sorted[i].startswith(tok):
+                out.setdefault(self._vocab_sorted[i], 0.8)
+                i += 1
+            # нечёткое: слова с достаточной долей общих триграмм
+            q = _trigrams(tok)
+            shared: Dict[str, int] = {}
+            for tg in q:
+                for w in self._vocab_trigrams.get(tg, ()):
+                    shared[w] = shared.get(w, 0) + 1
+            for w, n in shared.items():
+                sim = 2 * n / (len(q) + len(w))  # у слова из k букв k триграмм
+                if sim >= FUZZY_MIN_SIM and w not in out:
+                    out[w] = 0.6 * sim
+        return out
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Ищет по названиям и описаниям: точное слово, префикс, опечатки.
+        Остаются документы, где нашлось больше всего слов запроса; порядок — по весу с учётом редкости слова.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            n_docs = len(self._docs) or 1
+            matched: Dict[int, int] = {}
+            score: Dict[int, float] = {}
+            for tok in tokens:
+                best: Dict[int, float] = {}
+                for word, sim in self._expand(tok).items():
+                    for postings, weight in ((self._title_postings, TITLE_WEIGHT), (self._desc_postings, 1.0)):
+                        docs = postings.get(word)
+                        if not docs:
+                            continue
+                        idf = math.log(1 + n_docs / len(docs))
+                        w = sim * weight * idf
+                        for doc_id in docs:
+                            if w > best.get(doc_id, 0.0):
+                                best[doc_id] = w
+                for doc_id, w in best.items():
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+                    score[doc_id] = score.get(doc_id, 0.0) + w
+
+            # документы, где нашлось меньше слов запроса, чем у лучшего, — шум («день …»)
+            top = max(matched.values(), default=0)
+            ranked = sorted((d for d in score if matched[d] == top), key=score.__getitem__, reverse=True)
+            return [
+                {**self._docs[d], "dates": sorted(self._docs[d]["dates"])}
+                for d in ranked[:limit]
+            ]
+
+
+INDEX = HolidayIndex()
@@ -0,0 +1,79 @@
+# snapshot.py
+import asyncio
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import custom_holidays
+import holidays
+import metrics
+
+SNAPSHOT_FILE = Path("snapshot.json.gz")
+SNAPSHOT_FORMAT = 1
+
+# раздел -> (export, import); бот докладывает сюда свои кэши через register()
+_SECTIONS: Dict[str, Tuple[Callable[[], Dict], Callable[[Dict], None]]] = {
+    "holidays": (holidays.export_cache, holidays.import_cache),
+    "custom": (custom_holidays.export_cache, custom_holidays.import_cache),
+}
+
+
+def register(name: str, export_fn: Callable[[], Dict], import_fn: Callable[[Dict], None]) -> None:
+    _SECTIONS[name] = (export_fn, import_fn)
+
+
+def dump_snapshot() -> bytes:
+    """
+    Собирает и сериализует все разделы. Вызывать в потоке event loop: кэши меняются там же,
+    а json.dumps проходит их целиком, не отпуская GIL, — рабочие потоки в это время не вклинятся.
+    """
+    payload = {"format": SNAPSHOT_FORMAT, "saved_at": time.time()}
+    for name, (export_fn, _) in _SECTIONS.items():
+        payload[name] = export_fn()
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_snapshot(raw: bytes, path: Path = SNAPSHOT_FILE) -> int:
+    """Сжимает и пишет готовые байты атомарно (tmp + rename); можно в потоке. Возвращает размер файла."""
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wb", compresslevel=6) as f:
+        f.write(raw)
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def save_snapshot(path: Path = SNAPSHOT_FILE) -> int:
+    """Снапшот целиком синхронно — для скриптов, где нет event loop."""
+    return write_snapshot(dump_snapshot(), path)
+
+
+async def save_snapshot_async(path: Path = SNAPSHOT_FILE) -> int:
+    """Для бота: разделы собираются в цикле, сжатие и запись — в потоке."""
+    raw = dump_snapshot()
+    return await asyncio.to_thread(write_snapshot, raw, path)
+
+
+def load_snapshot(path: Path = SNAPSHOT_FILE) -> bool:
+    """Поднимает кэши из снапшота. Битый или чужой снапшот просто игнорируется."""
+    if not path.exists():
+        return False
+    with metrics.timed("snapshot_load"):
+        try:
+            with gzip.open(path, "rb") as f:
+                payload = json.loads(f.read().decode("utf-8"))
+        except Exception as e:
+            print(f"[snapshot] не удалось прочитать {path}: {e}")
+            return False
+        if payload.get("format") != SNAPSHOT_FORMAT:
+            return False
+        for name, (_, import_fn) in _SECTIONS.items():
+            if name not in payload:
+                continue
+            try:
+                import_fn(payload[name])
+            except Exception as e:
+                print(f"[snapshot] раздел {name} пропущен: {e}")
+    return True
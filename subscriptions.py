@@ -1,36 +1,293 @@
 # subscriptions.py
+import asyncio
+import heapq
 import json
+import mmap
+import os
+from array import array
+from bisect import bisect_left
 from pathlib import Path
-from typing import Set
+from typing import Dict, FrozenSet, Iterable, Iterator, Set, Tuple
 
-SUBS_FILE = Path("subs.json")
+SUBS_FILE = Path("subs.json")     # старый формат; читается один раз, если subs.bin ещё нет
+SUBS_BIN = Path("subs.bin")       # отсортированные chat_id, int64 в порядке байт машины
+SUBS_DELTA = Path("subs.delta")   # журнал «+id» / «-id» поверх subs.bin
 
+COMPACT_AFTER = 1024  # столько операций в журнале — и он вливается в subs.bin
+_CHUNK = 1 << 16
 
-def load_subs() -> Set[int]:
-    """Загружает множество chat_id из файла (если файла нет — пустое множество)."""
-    if SUBS_FILE.exists():
+
+def _write_ids(path: Path, sorted_ids: Iterable[int]) -> None:
+    """Атомарно переписывает файл с chat_id (tmp + rename), пишет кусками."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        buf = array("q")
+        for chat_id in sorted_ids:
+            buf.append(chat_id)
+            if len(buf) >= _CHUNK:
+                buf.tofile(f)
+                buf = array("q")
+        buf.tofile(f)
+    os.replace(tmp, path)
+
+
+class SubscriberStore:
+    """
+    Подписчики без загрузки в память: subs.bin отображается через mmap и ищется бинарным
+    поиском (O(log n)), свежие добавления/удаления лежат в маленьком оверлее и журнале.
+    Ведёт себя как множество: in, len, итерация (по возрастанию), add, discard.
+
+    Сжатие журнала (вливание оверлея в subs.bin) — compact_async(): файл пишется в потоке,
+    а подмена базы ждёт, пока закончатся все итерации (рассылки).
+    """
+
+    def __init__(self, base_path: Path = SUBS_BIN, delta_path: Path = SUBS_DELTA):
+        self._base_path = base_path
+        self._delta_path = delta_path
+        self._mm: mmap.mmap | None = None
+        self._ids = memoryview(b"").cast("q")
+        self._added: Set[int] = set()    # нет в subs.bin
+        self._removed: Set[int] = set()  # есть в subs.bin
+        self._delta_ops = 0
+        self._readers = 0         # идущие итерации (рассылки); базу под ними не меняем
+        self._compacting = False
+        self._open_base()
+        self._replay_delta()
+
+    # ---------- база ----------
+
+    def _open_base(self) -> None:
+        # старый mmap не закрываем явно: его может ещё читать идущая рассылка,
+        # он закроется сам, когда отпустят последний memoryview
+        self._mm = None
+        self._ids = memoryview(b"").cast("q")
+        if not self._base_path.exists() or self._base_path.stat().st_size == 0:
+            return
+        with open(self._base_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._ids = memoryview(self._mm).cast("q")
+
+    def _in_base(self, chat_id: int) -> bool:
+        ids = self._ids
+        i = bisect_left(ids, chat_id)
+        return i < len(ids) and ids[i] == chat_id
+
+    # ---------- журнал ----------
+
+    def _replay_delta(self) -> None:
+        if not self._delta_path.exists():
+            return
+        for line in self._delta_path.read_text(encoding="utf-8").split():
+            try:
+                op, chat_id = line[0], int(line[1:])
+            except (IndexError, ValueError):
+                continue
+            self._apply(op, chat_id)
+            self._delta_ops += 1
+
+    def _apply(self, op: str, chat_id: int) -> bool:
+        """Меняет оверлей; False — если менять было нечего."""
+        if op == "+":
+            if chat_id in self._removed:
+                self._removed.discard(chat_id)
+            elif chat_id not in self._added and not self._in_base(chat_id):
+                self._added.add(chat_id)
+            else:
+                return False
+        else:
+            if chat_id in self._added:
+                self._added.discard(chat_id)
+            elif chat_id not in self._removed and self._in_base(chat_id):
+                self._removed.add(chat_id)
+            else:
+                return False
+        return True
+
+    def _log(self, op: str, chat_id: int) -> None:
+        with open(self._delta_path, "a", encoding="utf-8") as f:
+            f.write(f"{op}{chat_id}\n")
+        self._delta_ops += 1
+
+    # ---------- сжатие ----------
+    # Три шага: снимок оверлея, запись новой subs.bin по снимку (можно в потоке — снимок
+    # неизменяемый, старый mmap только читается), подмена базы. Операции между первым и
+    # последним шагом идут в журнал как обычно. Если упасть после записи subs.bin, но до
+    # подмены, старый журнал поверх новой базы даёт то же состояние: при повторе журнала
+    # каждый chat_id получает свою последнюю операцию.
+
+    def needs_compaction(self) -> bool:
+        """Журнал разросся, и сейчас не идёт ни сжатие, ни итерация (рассылка)."""
+        return self._delta_ops >= COMPACT_AFTER and not self._compacting and not self._readers
+
+    def _begin_compaction(self) -> Tuple[memoryview, FrozenSet[int], FrozenSet[int]]:
+        self._compacting = True
+        return self._ids, frozenset(self._added), frozenset(self._removed)
+
+    def _write_compaction(self, snap: Tuple[memoryview, FrozenSet[int], FrozenSet[int]]) -> None:
+        ids, added, removed = snap
+        base = (x for x in ids if x not in removed) if removed else iter(ids)
+        _write_ids(self._base_path, heapq.merge(base, sorted(added)))
+
+    def _finish_compaction(self, snap: Tuple[memoryview, FrozenSet[int], FrozenSet[int]]) -> None:
+        """Открывает новую subs.bin и пересчитывает оверлей относительно неё (на руках — только изменённые id)."""
+        _, added_snap, removed_snap = snap
+        changed = self._added | self._removed | added_snap | removed_snap
+        now = {x: x in self for x in changed}  # по старой базе
+        in_new = {x: x in added_snap or (x not in removed_snap and self._in_base(x)) for x in changed}
+        self._open_base()
+        # новые множества, а не clear(): старые ещё может держать чужой код
+        self._added = {x for x in changed if now[x] and not in_new[x]}
+        self._removed = {x for x in changed if in_new[x] and not now[x]}
+        tmp = self._delta_path.with_name(self._delta_path.name + ".tmp")
+        tmp.write_text(
+            "".join(f"+{x}\n" for x in sorted(self._added)) + "".join(f"-{x}\n" for x in sorted(self._removed)),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self._delta_path)
+        self._delta_ops = len(self._added) + len(self._removed)
+        self._compacting = False
+
+    def compact(self) -> None:
+        """Вливает оверлей в subs.bin и очищает журнал — синхронно (для скриптов и тестов)."""
+        if self._readers:
+            raise RuntimeError("subs.bin нельзя сжимать во время итерации")
+        snap = self._begin_compaction()
+        try:
+            self._write_compaction(snap)
+        except BaseException:
+            self._compacting = False
+            raise
+        self._finish_compaction(snap)
+
+    async def compact_async(self, poll: float = 1.0) -> None:
+        """Сжатие без остановки event loop: запись в потоке, подмена базы — когда нет итераций."""
+        if self._compacting:
+            return
+        snap = self._begin_compaction()
+        try:
+            await asyncio.to_thread(self._write_compaction, snap)
+            while self._readers:  # идёт рассылка — пусть дочитает старую базу
+                await asyncio.sleep(poll)
+        except BaseException:
+            self._compacting = False
+            raise
+        self._finish_compaction(snap)
+
+    # ---------- интерфейс множества ----------
+
+    def __contains__(self, chat_id: int) -> bool:
+        chat_id = int(chat_id)
+        if chat_id in self._added:
+            return True
+        return chat_id not in self._removed and self._in_base(chat_id)
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._removed) + len(self._added)
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        По возрастанию; база читается прямо из mmap, без копии. Отписка во время итерации
+        учитывается (проверка на каждом шаге), подписка — нет: новые id попадут в следующий проход.
+        """
+        self._readers += 1
+        try:
+            added = frozenset(self._added)
+            for chat_id in heapq.merge(self._ids, sorted(added)):
+                # базу не подменят, пока итерация жива, — хватает свежих множеств оверлея
+                alive = chat_id in self._added if chat_id in added else chat_id not in self._removed
+                if alive:
+                    yield chat_id
+        finally:
+            self._readers -= 1
+
+    def add(self, chat_id: int) -> None:
+        chat_id = int(chat_id)
+        if self._apply("+", chat_id):
+            self._log("+", chat_id)
+
+    def discard(self, chat_id: int) -> None:
+        chat_id = int(chat_id)
+        if self._apply("-", chat_id):
+            self._log("-", chat_id)
+
+
+def load_subs() -> SubscriberStore:
+    """Открывает хранилище подписок; при первом запуске переносит subs.json в subs.bin."""
+    if not SUBS_BIN.exists() and SUBS_FILE.exists():
         try:
             data = json.loads(SUBS_FILE.read_text(encoding="utf-8"))
-            return set(int(x) for x in data)
+            save_subs(int(x) for x in data)
         except Exception:
-            return set()
-    return set()
+            pass
+    return SubscriberStore()
 
 
-def save_subs(chat_ids: Set[int]) -> None:
-    """Сохраняет множество chat_id в файл (как отсортированный список)."""
-    SUBS_FILE.write_text(json.dumps(sorted(chat_ids)), encoding="utf-8")
+def save_subs(chat_ids: Iterable[int]) -> None:
+    """Полностью переписывает subs.bin (отсортированно, без повторов) и сбрасывает журнал."""
+    _write_ids(SUBS_BIN, sorted(set(int(x) for x in chat_ids)))
+    SUBS_DELTA.unlink(missing_ok=True)
 
 
-def add_sub(chat_ids: Set[int], chat_id: int) -> Set[int]:
-    """Добавляет chat_id в подписку и сразу сохраняет."""
+def add_sub(chat_ids: SubscriberStore, chat_id: int) -> SubscriberStore:
+    """Добавляет chat_id в подписку и сразу сохраняет (строкой в журнал)."""
     chat_ids.add(int(chat_id))
-    save_subs(chat_ids)
     return chat_ids
 
 
-def remove_sub(chat_ids: Set[int], chat_id: int) -> Set[int]:
-    """Удаляет chat_id из подписки и сразу сохраняет."""
+def remove_sub(chat_ids: SubscriberStore, chat_id: int) -> SubscriberStore:
+    """Удаляет chat_id из подписки и сразу сохраняет (строкой в журнал)."""
     chat_ids.discard(int(chat_id))
-    save_subs(chat_ids)
     return chat_ids
+
+
+# --- Настройки подписчиков: что присылать ---
+PREFS_FILE = Path("subs_prefs.json")
+
+PROFILES = ("all", "russia", "custom")  # все страны / только Россия / только свои
+DEFAULT_PROFILE = "all"
+
+
+def load_prefs() -> Dict[int, str]:
+    """chat_id -> профиль; хранятся только отличные от DEFAULT_PROFILE."""
+    if PREFS_FILE.exists():
+        try:
+            data = json.loads(PREFS_FILE.read_text(encoding="utf-8"))
+            return {int(k): v for k, v in data.items() if v in PROFILES}
+        except Exception:
+            return {}
+    return {}
+
+
+def save_prefs(prefs: Dict[int, str]) -> None:
+    """Атомарно (tmp + rename): оборванная запись не должна сбросить профили всем чатам."""
+    tmp = PREFS_FILE.with_name(PREFS_FILE.name + ".tmp")
+    tmp.write_text(
+        json.dumps({str(k): v for k, v in sorted(prefs.items())}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    os.replace(tmp, PREFS_FILE)
+
+
+def set_pref(prefs: Dict[int, str], chat_id: int, profile: str) -> Dict[int, str]:
+    """Меняет профиль чата и сразу сохраняет."""
+    if profile not in PROFILES:
+        raise ValueError(f"Неизвестный профиль: {profile}")
+    if profile == DEFAULT_PROFILE:
+        prefs.pop(int(chat_id), None)
+    else:
+        prefs[int(chat_id)] = profile
+    save_prefs(prefs)
+    return prefs
+
+
+def group_by_profile(chat_ids: Iterable[int], prefs: Dict[int, str]) -> Dict[str, Iterable[int]]:
+    """
+    Разбивает подписчиков на группы с одинаковым профилем (для рассылки «рендер раз на профиль»).
+    Группы с настройкой — списки из prefs; основная группа — ленивый проход по chat_ids без копии.
+    """
+    groups: Dict[str, Iterable[int]] = {}
+    for chat_id, profile in prefs.items():
+        if chat_id in chat_ids:
+            groups.setdefault(profile, []).append(chat_id)
+    groups[DEFAULT_PROFILE] = (c for c in chat_ids if c not in prefs)
+    return groups
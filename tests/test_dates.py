@@ -0,0 +1,46 @@
+# tests/test_dates.py
+import datetime
+
+import pytest
+
+from dates import ICAL_YEARS_AROUND, parse_ical_range
+
+TODAY = datetime.date(2026, 10, 19)
+
+
+def d(y, m, day):
+    return datetime.date(y, m, day)
+
+
+@pytest.mark.parametrize("args, expected", [
+    ("", (d(2026, 1, 1), d(2026, 12, 31))),
+    ("2027", (d(2027, 1, 1), d(2027, 12, 31))),
+    ("4 ноября", (d(2026, 11, 4), d(2026, 11, 4))),
+    ("4 ноября 2025", (d(2025, 11, 4), d(2025, 11, 4))),
+    ("01.11 - 30.11", (d(2026, 11, 1), d(2026, 11, 30))),
+    ("01.11-30.11", (d(2026, 11, 1), d(2026, 11, 30))),
+    ("4 ноября 2025 — 10 января 2026", (d(2025, 11, 4), d(2026, 1, 10))),
+    ("01.11 30.11", (d(2026, 11, 1), d(2026, 11, 30))),
+])
+def test_parse_ical_range(args, expected):
+    assert parse_ical_range(args, TODAY) == expected
+
+
+@pytest.mark.parametrize("args", [
+    "0000", "9999", "1990",
+    str(TODAY.year + ICAL_YEARS_AROUND + 1),
+    "31.12.9999",
+    "01.01.2026 - 31.12.9999",
+    "01.01.0001 - 01.01.2026",
+    "30.11 - 01.11",
+    "не дата",
+])
+def test_parse_ical_range_rejects(args):
+    assert parse_ical_range(args, TODAY) is None
+
+
+def test_parse_ical_range_edges_are_inclusive():
+    first, last = TODAY.year - ICAL_YEARS_AROUND, TODAY.year + ICAL_YEARS_AROUND
+    assert parse_ical_range(str(first), TODAY) == (d(first, 1, 1), d(first, 12, 31))
+    assert parse_ical_range(str(last), TODAY) == (d(last, 1, 1), d(last, 12, 31))
+
@@ -0,0 +1,68 @@
+# tests/test_ical.py
+import datetime
+
+import pytest
+
+import holidays
+
+
+@pytest.fixture(autouse=True)
+def clean_caches(monkeypatch):
+    monkeypatch.setattr(holidays, "_DETAILS_CACHE", {})
+    monkeypatch.setattr(holidays, "_DAY_ITEMS", {})
+
+
+def events(lines):
+    """Разбивает .ics на события: список словарей {поле: значение}."""
+    found, cur = [], None
+    for line in "".join(lines).replace("\r\n ", "").split("\r\n"):
+        if line == "BEGIN:VEVENT":
+            cur = {}
+        elif line == "END:VEVENT":
+            found.append(cur)
+            cur = None
+        elif cur is not None and ":" in line:
+            key, value = line.split(":", 1)
+            cur[key] = value
+    return found
+
+
+def test_days_without_descriptions_come_from_crawl():
+    day, other = datetime.date(2026, 11, 4), datetime.date(2026, 11, 5)
+    holidays._DETAILS_CACHE[day] = {"limit": 20, "items": [
+        {"title": "День народного единства", "url": "https://x/1", "desc": "Описание"},
+    ]}
+    holidays._DAY_ITEMS[other] = {"limit": 20, "items": [{"title": "День из обхода", "url": "https://x/2"}]}
+
+    found = events(holidays.iter_ical(day, other))
+    assert [(e["DTSTART;VALUE=DATE"], e["SUMMARY"]) for e in found] == [
+        ("20261104", "День народного единства"),
+        ("20261105", "День из обхода"),
+    ]
+    assert found[0]["DESCRIPTION"] == "Описание"
+    assert "DESCRIPTION" not in found[1]
+
+
+def test_local_records_annual_and_once():
+    start, end = datetime.date(2026, 1, 1), datetime.date(2026, 12, 31)
+    local = [
+        {"date": "2026-03-08", "title": "Женский день", "repeat": "annual", "url": "https://x/8"},
+        {"date": "2026-06-01", "title": "Разовое", "repeat": "once", "desc": "Только раз"},
+        {"date": "2025-06-01", "title": "Прошлогоднее", "repeat": "once"},
+    ]
+    found = {e["SUMMARY"]: e for e in events(holidays.iter_ical(start, end, local=local))}
+    assert set(found) == {"Женский день", "Разовое"}
+    assert found["Женский день"]["RRULE"] == "FREQ=YEARLY"
+    assert found["Женский день"]["URL"] == "https://x/8"
+    assert "RRULE" not in found["Разовое"]
+    assert found["Разовое"]["DESCRIPTION"] == "Только раз"
+    assert found["Разовое"]["UID"].startswith("local-")
+
+
+def test_iter_ical_survives_last_representable_day():
+    lines = list(holidays.iter_ical(datetime.date.max, datetime.date.max, [
+        {"date": "9999-12-31", "title": "Конец календаря"},
+    ]))
+    assert lines[-1] == "END:VCALENDAR\r\n"
+    assert "DTSTART;VALUE=DATE:99991231\r\n" in lines
+    assert not any(line.startswith("DTEND") for line in lines)
@@ -0,0 +1,118 @@
+# tests/test_subscriptions.py
+import asyncio
+
+import pytest
+
+import subscriptions
+from subscriptions import SubscriberStore, _write_ids
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "subs.bin", tmp_path / "subs.delta"
+
+
+def make_store(paths, base=()):
+    base_path, delta_path = paths
+    if base:
+        _write_ids(base_path, sorted(base))
+    return SubscriberStore(base_path, delta_path)
+
+
+def test_journal_replay_restores_overlay(paths):
+    store = make_store(paths, [1, 2, 3])
+    store.add(10)
+    store.discard(2)
+    store.add(2)
+    store.discard(3)
+    store.add(-5)
+
+    reopened = SubscriberStore(*paths)
+    assert list(reopened) == [-5, 1, 2, 10]
+    assert len(reopened) == 4
+    assert 3 not in reopened and 2 in reopened
+
+
+def test_replay_ignores_broken_lines(paths):
+    store = make_store(paths, [1])
+    store.add(7)
+    with open(paths[1], "a", encoding="utf-8") as f:
+        f.write("мусор\n+\n-1\n")
+    assert list(SubscriberStore(*paths)) == [7]
+
+
+def test_compact_merges_overlay_and_rewrites_journal(paths):
+    store = make_store(paths, [1, 2, 3])
+    store.add(4)
+    store.discard(1)
+    store.compact()
+
+    assert list(store) == [2, 3, 4]
+    assert paths[1].read_text(encoding="utf-8") == ""
+    assert list(SubscriberStore(*paths)) == [2, 3, 4]
+
+
+def test_compaction_does_not_resurrect_unsubscribed_during_iteration(paths):
+    store = make_store(paths, [1, 2, 3])
+    store.discard(2)
+
+    async def scenario():
+        it = iter(store)
+        assert next(it) == 1
+        task = asyncio.create_task(store.compact_async(poll=0.01))
+        await asyncio.sleep(0.1)  # новая subs.bin записана, подмена ждёт конца итерации
+        assert not task.done()
+        store.discard(3)
+        assert list(it) == []
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(scenario())
+    assert list(store) == [1]
+    assert list(SubscriberStore(*paths)) == [1]
+
+
+def test_ops_during_background_compaction_are_kept(paths):
+    store = make_store(paths, [1, 2, 3])
+    store.add(4)
+    store.discard(1)
+    snap = store._begin_compaction()
+    store.add(1)
+    store.discard(4)
+    store.add(5)
+    store.discard(2)
+    store._write_compaction(snap)
+    store._finish_compaction(snap)
+
+    assert list(store) == [1, 3, 5]
+    assert list(SubscriberStore(*paths)) == [1, 3, 5]
+
+
+def test_crash_between_write_and_swap_replays_old_journal(paths):
+    store = make_store(paths, [1, 2, 3])
+    store.add(4)
+    store.discard(1)
+    snap = store._begin_compaction()
+    store.add(1)
+    store.discard(3)
+    store._write_compaction(snap)  # subs.bin уже новая, журнал ещё старый
+
+    assert list(SubscriberStore(*paths)) == [1, 2, 4]
+
+
+def test_needs_compaction(paths, monkeypatch):
+    monkeypatch.setattr(subscriptions, "COMPACT_AFTER", 3)
+    store = make_store(paths, [1])
+    store.add(2)
+    store.add(3)
+    assert not store.needs_compaction()
+    store.add(4)
+    assert store.needs_compaction()
+    it = iter(store)
+    next(it)
+    assert not store.needs_compaction()  # идёт рассылка
+    with pytest.raises(RuntimeError):
+        store.compact()
+    it.close()
+    store.compact()
+    assert not store.needs_compaction()
+    assert list(store) == [1, 2, 3, 4]
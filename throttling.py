@@ -0,0 +1,112 @@
+# throttling.py
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message
+
+import metrics
+from dates import parse_date, today_msk
+
+
+class LookupThrottle(BaseMiddleware):
+    """
+    Ограничивает дорогие запросы праздников (хендлеры с флагом lookup):
+      • на чат — token bucket: burst запросов подряд, дальше один раз в refill секунд;
+      • одна и та же (чат, дата) чаще, чем раз в dedupe_window секунд, — повтор, не ищем.
+    Отсечённым — короткий ответ без похода на сайт (не чаще раза в notice_interval на чат).
+    Флаг: "today" — дата сегодняшняя, "date" — дата из текста сообщения.
+    """
+
+    def __init__(self, burst: int = 5, refill: float = 10.0, dedupe_window: float = 30.0,
+                 notice_interval: float = 30.0, max_chats: int = 100_000):
+        self.burst = burst
+        self.refill = refill
+        self.dedupe_window = dedupe_window
+        self.notice_interval = notice_interval
+        self.max_chats = max_chats
+        # chat_id -> (токены, время пересчёта); порядок — по последнему обращению
+        self._buckets: "OrderedDict[int, tuple[float, float]]" = OrderedDict()
+        # (chat_id, дата) -> время последнего ответа; порядок — по времени
+        self._recent: "OrderedDict[tuple, float]" = OrderedDict()
+        self._noticed: "OrderedDict[int, float]" = OrderedDict()
+
+    def _prune(self, now: float) -> None:
+        # полный бакет хранить незачем — новый будет таким же
+        self._trim(self._buckets, now, self.burst * self.refill, lambda v: v[1])
+        self._trim(self._recent, now, self.dedupe_window, lambda v: v)
+        self._trim(self._noticed, now, self.notice_interval, lambda v: v)
+
+    def _trim(self, store: OrderedDict, now: float, max_age: float, stamp: Callable[[Any], float]) -> None:
+        """Очереди упорядочены по времени: старое (и всё сверх max_chats) снимается с начала."""
+        while store:
+            oldest = store[next(iter(store))]
+            if now - stamp(oldest) < max_age and len(store) <= self.max_chats:
+                break
+            store.popitem(last=False)
+
+    def _take(self, chat_id: int, now: float) -> bool:
+        tokens, ts = self._buckets.pop(chat_id, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - ts) / self.refill)
+        ok = tokens >= 1.0
+        self._buckets[chat_id] = (tokens - 1.0 if ok else tokens, now)
+        return ok
+
+    def allow(self, chat_id: int) -> bool:
+        """Тот же бакет вне хендлеров сообщений (inline-режим): можно ли сейчас идти на сайт."""
+        now = time.monotonic()
+        self._prune(now)
+        ok = self._take(chat_id, now)
+        metrics.incr("lookups_passed" if ok else "lookups_shed_throttle")
+        return ok
+
+    def _retry_after(self, chat_id: int) -> int:
+        tokens, _ = self._buckets.get(chat_id, (0.0, 0.0))
+        return max(1, round((1.0 - tokens) * self.refill))
+
+    async def _notice(self, event: Message, text: str, now: float) -> None:
+        chat_id = event.chat.id
+        last = self._noticed.get(chat_id)
+        if last is not None and now - last < self.notice_interval:
+            return
+        self._noticed.pop(chat_id, None)
+        self._noticed[chat_id] = now
+        await event.answer(text)
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        kind = get_flag(data, "lookup")
+        if not kind:
+            return await handler(event, data)
+        target = today_msk() if kind == "today" else parse_date(event.text)
+        if target is None:  # не дата — хендлер сам ничего не ищет
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._prune(now)
+        chat_id = event.chat.id
+
+        key = (chat_id, target)
+        last = self._recent.get(key)
+        if last is not None and now - last < self.dedupe_window:
+            metrics.incr("lookups_shed_dedupe")
+            await self._notice(event, "Эту дату я только что показывал ☝️", now)
+            return None
+
+        if not self._take(chat_id, now):
+            metrics.incr("lookups_shed_throttle")
+            await self._notice(
+                event, f"Слишком много запросов 🙏 Попробуйте через {self._retry_after(chat_id)} с.", now,
+            )
+            return None
+
+        self._recent.pop(key, None)
+        self._recent[key] = now
+        metrics.incr("lookups_passed")
+        return await handler(event, data)